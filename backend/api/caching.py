@@ -0,0 +1,72 @@
+import math
+import random
+import time
+import uuid
+
+from django.core.cache import cache
+
+LOCK_TIMEOUT = 10
+STALE_TTL = 5 * 60
+WAIT_TIMEOUT = 2.0
+POLL_INTERVAL = 0.02
+EARLY_REFRESH_BETA = 1.0
+
+
+def _release(lock_key, token):
+    # Если пересчёт шёл дольше LOCK_TIMEOUT, блокировку мог взять
+    # другой запрос, и снимать её нельзя.
+    if cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def _refresh(key, lock_key, token, compute, ttl):
+    try:
+        started = time.monotonic()
+        value = compute()
+        cost = time.monotonic() - started
+        cache.set(key, (value, time.time() + ttl, cost), ttl + STALE_TTL)
+        return value
+    finally:
+        _release(lock_key, token)
+
+
+def _fill(key, lock_key, token, compute, ttl):
+    # Между промахом и взятием блокировки значение мог записать другой
+    # запрос, который уже снял блокировку.
+    entry = cache.get(key)
+    if entry is not None:
+        _release(lock_key, token)
+        return entry[0]
+    return _refresh(key, lock_key, token, compute, ttl)
+
+
+def single_flight(key, compute, ttl):
+    # Значение пересчитывает только тот, кто взял короткую блокировку
+    # в кэше. Остальные получают устаревшее значение, а если его нет —
+    # ждут, пока пересчёт закончится. Запись живёт в кэше на STALE_TTL
+    # дольше срока годности, чтобы было что отдать во время пересчёта.
+    # Горячие ключи пересчитываются заранее с вероятностью, растущей к
+    # концу срока (XFetch): чем дороже пересчёт, тем раньше.
+    lock_key = f'{key}:lock'
+    token = uuid.uuid4().hex
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires, cost = entry
+        early = cost * EARLY_REFRESH_BETA * -math.log(1 - random.random())
+        if time.time() + early < expires:
+            return value
+        if not cache.add(lock_key, token, LOCK_TIMEOUT):
+            return value
+        return _refresh(key, lock_key, token, compute, ttl)
+    if cache.add(lock_key, token, LOCK_TIMEOUT):
+        return _fill(key, lock_key, token, compute, ttl)
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+        if cache.add(lock_key, token, LOCK_TIMEOUT):
+            # Пересчитывавший запрос упал и снял блокировку.
+            return _fill(key, lock_key, token, compute, ttl)
+    return compute()
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    # Блокировки single_flight и счётчики TokenBucketThrottle работают,
+    # только если кэш видят все воркеры.
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Error(
+            f'Кэш {backend} не общий для процессов.',
+            hint='Укажите в CACHES общий кэш: Redis или Memcached.',
+            id='api.E001',
+        )
+    ]
@@ -0,0 +1,130 @@
+import hashlib
+
+import orjson
+from django.db.models import Count, Exists, Max, OuterRef, Q
+
+from recipes.documents import current_version
+from recipes.models import AddedToFavorite, Change, Recipe, ShoppingСart
+from recipes.reference import reference_data
+
+FACET_FILTERS = ('tags', 'is_favorited', 'is_in_shopping_cart')
+IGNORED_FILTERS = ('ordering',)
+
+
+def user_version(user_id):
+    # Избранное и список покупок меняются в одной транзакции с записью в
+    # журнал изменений, поэтому последний id журнала пользователя растёт
+    # ровно тогда, когда его счётчики могли измениться, и виден всем
+    # процессам только после коммита. Сжатие журнала последнюю запись
+    # не удаляет.
+    return Change.objects.filter(user_id=user_id).aggregate(
+        version=Max('id')
+    )['version'] or 0
+
+
+def _signature(cleaned_data):
+    return orjson.dumps(
+        {
+            name: sorted(value) if isinstance(value, list)
+            else getattr(value, 'pk', value)
+            for name, value in cleaned_data.items()
+            if name not in IGNORED_FILTERS and value not in (None, '', [])
+        },
+        option=orjson.OPT_SORT_KEYS
+    )
+
+
+def cache_key(filterset):
+    user = filterset.request.user
+    owner = (
+        f'{user.id}.{user_version(user.id)}' if user.is_authenticated
+        else 'anon'
+    )
+    signature = hashlib.md5(
+        _signature(filterset.form.cleaned_data)
+    ).hexdigest()
+    return f'recipes:facets:{current_version()}:{owner}:{signature}'
+
+
+def _tagged(tag_ids):
+    return Exists(
+        Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'), tag_id__in=tag_ids
+        )
+    )
+
+
+def _related(model, user):
+    return Exists(
+        model.objects.filter(recipe_id=OuterRef('pk'), user_id=user.id)
+    )
+
+
+def _combine(conditions, exclude=None):
+    combined = None
+    for name, condition in conditions.items():
+        if name == exclude:
+            continue
+        combined = condition if combined is None else combined & condition
+    return combined
+
+
+def _both(condition, other):
+    return condition if other is None else condition & other
+
+
+def recipe_facets(filterset):
+    # Счётчики считаются одним агрегатом (COUNT ... FILTER в
+    # PostgreSQL). Для каждого фасета действуют все фильтры, кроме его
+    # собственного: так у тега видно, сколько рецептов добавится, если
+    # отметить и его.
+    cleaned_data = filterset.form.cleaned_data
+    queryset = filterset.queryset
+    for name, value in cleaned_data.items():
+        if name not in FACET_FILTERS and name not in IGNORED_FILTERS:
+            queryset = filterset.filters[name].filter(queryset, value)
+    user = filterset.request.user
+    tags = reference_data.tags
+    slugs = {tags.field(id, 'slug'): id for id in tags.ids}
+    conditions = {}
+    if cleaned_data.get('tags'):
+        conditions['tags'] = Q(
+            _tagged([slugs[slug] for slug in cleaned_data['tags']])
+        )
+    related = {}
+    if user.is_authenticated:
+        related = {
+            'is_favorited': Q(_related(AddedToFavorite, user)),
+            'is_in_shopping_cart': Q(_related(ShoppingСart, user)),
+        }
+        for name, condition in related.items():
+            value = cleaned_data.get(name)
+            if value is not None:
+                conditions[name] = condition if value else ~condition
+    aggregates = {
+        'count': Count('pk', filter=_combine(conditions)),
+        **{
+            f'tag_{id}': Count(
+                'pk',
+                filter=_both(
+                    Q(_tagged([id])), _combine(conditions, 'tags')
+                )
+            )
+            for id in tags.ids
+        },
+        **{
+            name: Count(
+                'pk', filter=_both(condition, _combine(conditions, name))
+            )
+            for name, condition in related.items()
+        },
+    }
+    counts = queryset.order_by().aggregate(**aggregates)
+    return {
+        'count': counts['count'],
+        'tags': {slug: counts[f'tag_{id}'] for slug, id in slugs.items()},
+        **{
+            name: counts.get(name, 0)
+            for name in ('is_favorited', 'is_in_shopping_cart')
+        },
+    }
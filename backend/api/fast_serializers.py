@@ -0,0 +1,224 @@
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from recipes.documents import (
+    AUTHOR_FIELDS, INGREDIENT_FIELDS, TAG_FIELDS, load
+)
+from recipes.models import (
+    AddedToFavorite, Recipe, ShoppingСart, Subscribe
+)
+from .images import variant_urls
+from .serializers import RecipeGetSerializer, UserSubscribeSerializer
+
+User = get_user_model()
+
+# Быстрый путь только для чтения: ответы собираются из .values() и
+# словарей, без экземпляров моделей и полей DRF. Вывод должен совпадать
+# с RecipeGetSerializer и UserSubscribeSerializer байт в байт, это
+# проверяет команда bench_serializers.
+USER_FIELDS = AUTHOR_FIELDS
+SHORT_RECIPE_FIELDS = ('id', 'name', 'image', 'cooking_time')
+
+
+def image_url(name, request=None):
+    if not name:
+        return None
+    url = Recipe._meta.get_field('image').storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def _current_user_id(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    return user.id
+
+
+def _related_ids(model, user_id, field, ids):
+    if user_id is None or not ids:
+        return set()
+    return set(
+        model.objects.filter(
+            user_id=user_id, **{f'{field}_id__in': ids}
+        ).values_list(f'{field}_id', flat=True)
+    )
+
+
+def recipe_values(queryset):
+    return queryset.prefetch_related(None).values(
+        'id', 'author_id', 'document__document'
+    )
+
+
+def _documents(rows):
+    documents = {
+        row['id']: row['document__document'] for row in rows
+        if row['document__document'] is not None
+    }
+    missing = [row['id'] for row in rows if row['id'] not in documents]
+    if missing:
+        documents.update(load(missing))
+    return documents
+
+
+def shared_recipes(rows, request, selection):
+    # Не зависящая от пользователя часть ответа: флаги выключены, их
+    # выставляет personalize. Результат можно кэшировать для всех.
+    rows = list(rows)
+    documents = _documents(rows)
+
+    def author(document):
+        author = dict(zip(AUTHOR_FIELDS, document['author']))
+        author['is_subscribed'] = False
+        return author
+
+    values = {
+        'id': lambda document: document['id'],
+        'tags': (
+            (lambda document: [tag[0] for tag in document['tags']])
+            if selection.is_compact('tags')
+            else (lambda document: [
+                dict(zip(TAG_FIELDS, tag)) for tag in document['tags']
+            ])
+        ),
+        'author': (
+            (lambda document: document['author'][1])
+            if selection.is_compact('author')
+            else author
+        ),
+        'ingredients': (
+            (lambda document: [
+                {'id': ingredient[0], 'amount': ingredient[-1]}
+                for ingredient in document['ingredients']
+            ])
+            if selection.is_compact('ingredients')
+            else (lambda document: [
+                dict(zip(INGREDIENT_FIELDS, ingredient))
+                for ingredient in document['ingredients']
+            ])
+        ),
+        'is_favorited': lambda document: False,
+        'is_in_shopping_cart': lambda document: False,
+        'name': lambda document: document['name'],
+        'image': lambda document: image_url(document['image'], request),
+        'image_variants': (
+            lambda document: variant_urls(document['image'], request)
+        ),
+        'text': lambda document: document['text'],
+        'cooking_time': lambda document: document['cooking_time'],
+    }
+    fields = [
+        (name, values[name]) for name in RecipeGetSerializer.Meta.fields
+        if name in selection
+    ]
+    return [
+        (
+            row['id'],
+            row['author_id'],
+            {name: value(documents[row['id']]) for name, value in fields}
+        )
+        for row in rows if row['id'] in documents
+    ]
+
+
+def personalize(recipes, request, selection):
+    user_id = _current_user_id(request)
+    if user_id is None:
+        return [data for _, _, data in recipes]
+    ids = [id for id, _, _ in recipes]
+    favorited = in_cart = subscribed = set()
+    if 'is_favorited' in selection:
+        favorited = _related_ids(AddedToFavorite, user_id, 'recipe', ids)
+    if 'is_in_shopping_cart' in selection:
+        in_cart = _related_ids(ShoppingСart, user_id, 'recipe', ids)
+    author = 'author' in selection and not selection.is_compact('author')
+    if author:
+        subscribed = _related_ids(
+            Subscribe, user_id, 'subscribed',
+            {author_id for _, author_id, _ in recipes}
+        )
+    result = []
+    for id, author_id, data in recipes:
+        data = dict(data)
+        if 'is_favorited' in selection:
+            data['is_favorited'] = id in favorited
+        if 'is_in_shopping_cart' in selection:
+            data['is_in_shopping_cart'] = id in in_cart
+        if author:
+            data['author'] = {
+                **data['author'], 'is_subscribed': author_id in subscribed
+            }
+        result.append(data)
+    return result
+
+
+def serialize_recipes(rows, request, selection):
+    return personalize(
+        shared_recipes(rows, request, selection), request, selection
+    )
+
+
+def _recipes_limit(request):
+    try:
+        limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return None
+    return limit if limit >= 0 else None
+
+
+def _author_recipes(author_ids, limit):
+    recipes = Recipe.objects.filter(author_id__in=author_ids)
+    if limit is not None:
+        recipes = recipes.annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=F('pub_date').desc()
+            )
+        ).filter(position__lte=limit)
+    grouped = defaultdict(list)
+    for row in recipes.values('author_id', *SHORT_RECIPE_FIELDS):
+        grouped[row.pop('author_id')].append(row)
+    return grouped
+
+
+def serialize_subscriptions(rows, request, selection):
+    rows = list(rows)
+    ids = [row['id'] for row in rows]
+    user_id = _current_user_id(request)
+    subscribed = recipes = counts = {}
+    if 'is_subscribed' in selection:
+        subscribed = _related_ids(Subscribe, user_id, 'subscribed', ids)
+    if 'recipes' in selection:
+        recipes = _author_recipes(ids, _recipes_limit(request))
+        for author_recipes in recipes.values():
+            for recipe in author_recipes:
+                recipe['image'] = image_url(recipe['image'])
+    if 'recipes_count' in selection:
+        counts = dict(
+            Recipe.objects.filter(author_id__in=ids).values_list(
+                'author_id'
+            ).annotate(Count('id')).order_by()
+        )
+    values = {
+        'is_subscribed': lambda row: row['id'] in subscribed,
+        'recipes': (
+            (lambda row: [
+                recipe['id'] for recipe in recipes.get(row['id'], [])
+            ])
+            if selection.is_compact('recipes')
+            else (lambda row: recipes.get(row['id'], []))
+        ),
+        'recipes_count': lambda row: counts.get(row['id'], 0),
+    }
+    fields = [
+        (name, values.get(name, lambda row, name=name: row[name]))
+        for name in UserSubscribeSerializer.Meta.fields
+        if name in selection
+    ]
+    return [{name: value(row) for name, value in fields} for row in rows]
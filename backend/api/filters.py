@@ -3,10 +3,8 @@ import django_filters as filters
 from django_filters.widgets import BooleanWidget
 
 from recipes.models import Recipe
-
-TAG_CHOICES = (
-    ('breakfast', 'breakfast'), ('lunch', 'lunch'), ('dinner', 'dinner')
-)
+from recipes.reference import reference_data
+from recipes.search import search_recipes
 
 User = get_user_model()
 
@@ -24,7 +22,16 @@ class RecipeFilter(filters.FilterSet):
     )
     tags = filters.MultipleChoiceFilter(
         field_name='tags__slug',
-        choices=TAG_CHOICES
+        choices=lambda: [
+            (slug, slug) for slug in (
+                row[-1] for row in reference_data.tags.rows
+            )
+        ]
+    )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'popular'),),
+        method='filter_ordering'
     )
 
     class Meta:
@@ -48,3 +55,9 @@ class RecipeFilter(filters.FilterSet):
         if int(value):
             return queryset.filter(favorite=user)
         return queryset.exclude(favorite=user)
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by('-score', '-pub_date')
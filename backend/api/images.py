@@ -0,0 +1,157 @@
+import logging
+import os
+import threading
+from concurrent.futures import TimeoutError
+from functools import partial
+
+from django.conf import settings
+from django.utils._os import safe_join
+
+VARIANT_SUFFIX = '.webp'
+EVICTION_TARGET = 0.9
+
+_lock = threading.Lock()
+_executor = None
+_pending = {}
+_cache_size = None
+
+logger = logging.getLogger(__name__)
+
+
+def variant_name(name, variant):
+    return f'{settings.IMAGE_CACHE_DIR}/{variant}/{name}{VARIANT_SUFFIX}'
+
+
+def variant_urls(name, request=None):
+    if not name:
+        return None
+    urls = {}
+    for variant in settings.IMAGE_VARIANTS:
+        url = settings.MEDIA_URL + variant_name(name, variant)
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        urls[variant] = url
+    return urls
+
+
+def render_variant(source, target, width):
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        image.thumbnail((width, width * 4), Image.LANCZOS)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temporary = f'{target}.{os.getpid()}.tmp'
+        image.save(temporary, 'WEBP', quality=80, method=4)
+    os.replace(temporary, target)
+    return os.path.getsize(target)
+
+
+def _get_executor():
+    from concurrent.futures import ProcessPoolExecutor
+
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+    return _executor
+
+
+def _cache_files(root):
+    for directory, _, files in os.walk(root):
+        for file in files:
+            path = os.path.join(directory, file)
+            try:
+                yield path, os.stat(path)
+            except FileNotFoundError:
+                continue
+
+
+def evict(root, max_bytes, keep=None):
+    # Вытесняются самые старые варианты (FIFO по времени создания):
+    # попадания отдаёт nginx, не обращаясь к Django, а atime на
+    # большинстве файловых систем не обновляется, так что честного LRU
+    # здесь не построить.
+    files = sorted(_cache_files(root), key=lambda item: item[1].st_mtime)
+    total = sum(stat.st_size for _, stat in files)
+    target = max_bytes * EVICTION_TARGET
+    for path, stat in files:
+        if total <= target:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= stat.st_size
+    return total
+
+
+def _account(root, size, keep):
+    # Размер кэша считается приблизительно и локально для процесса;
+    # при превышении лимита evict пересчитывает его по диску.
+    global _cache_size
+    with _lock:
+        if _cache_size is None:
+            _cache_size = sum(
+                stat.st_size for _, stat in _cache_files(root)
+            )
+        else:
+            _cache_size += size
+        if _cache_size <= settings.IMAGE_CACHE_MAX_BYTES:
+            return
+        _cache_size = evict(root, settings.IMAGE_CACHE_MAX_BYTES, keep)
+
+
+def render_variants(name):
+    source = safe_join(settings.MEDIA_ROOT, name)
+    root = safe_join(settings.MEDIA_ROOT, settings.IMAGE_CACHE_DIR)
+    for variant, width in settings.IMAGE_VARIANTS.items():
+        target = safe_join(settings.MEDIA_ROOT, variant_name(name, variant))
+        if not os.path.exists(target):
+            _account(root, render_variant(source, target, width), target)
+
+
+def _finish(target, future):
+    with _lock:
+        _pending.pop(target, None)
+
+
+def get_variant(name, variant):
+    width = settings.IMAGE_VARIANTS[variant]
+    source = safe_join(settings.MEDIA_ROOT, name)
+    target = safe_join(settings.MEDIA_ROOT, variant_name(name, variant))
+    if os.path.exists(target):
+        return target
+    if not os.path.isfile(source):
+        return None
+    with _lock:
+        future = _pending.get(target)
+        owner = future is None
+        if owner:
+            future = _get_executor().submit(
+                render_variant, source, target, width
+            )
+            _pending[target] = future
+    if owner:
+        # Запись живёт, пока идёт отрисовка, даже если её владелец
+        # перестал ждать по таймауту: иначе следующий запрос запустил
+        # бы вторую отрисовку того же файла.
+        future.add_done_callback(partial(_finish, target))
+    try:
+        size = future.result(timeout=settings.IMAGE_RENDER_TIMEOUT)
+    except TimeoutError:
+        raise
+    except OSError:
+        # Исходник повреждён или не является изображением.
+        logger.warning('Cannot render %s', source, exc_info=True)
+        return None
+    if owner:
+        _account(
+            safe_join(settings.MEDIA_ROOT, settings.IMAGE_CACHE_DIR),
+            size,
+            target
+        )
+    return target
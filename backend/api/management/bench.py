@@ -0,0 +1,81 @@
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from recipes.models import (
+    AddedToFavorite, Ingredient, IngredientRecipe, Recipe, ShoppingСart,
+    Subscribe, Tag
+)
+
+User = get_user_model()
+
+
+def populate(total, ingredients_per_recipe=6):
+    prefix = uuid.uuid4().hex[:8]
+    user, *authors = [
+        User.objects.create(
+            username=f'bench_{prefix}_{number}',
+            email=f'bench_{prefix}_{number}@example.com',
+            first_name='Bench',
+            last_name=str(number)
+        )
+        for number in range(4)
+    ]
+    tags = [
+        Tag.objects.create(
+            name=f'bench {prefix} {number}',
+            color=f'#{prefix[:4]}{number:02d}'[:7],
+            slug=f'bench-{prefix}-{number}'
+        )
+        for number in range(3)
+    ]
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f'bench {prefix} {number}', measurement_unit='г')
+        for number in range(30)
+    )
+    recipes = Recipe.objects.bulk_create(
+        Recipe(
+            author=authors[number % len(authors)],
+            name=f'Рецепт {number}',
+            text='Описание рецепта ' * 20,
+            image='recipes/images/bench.png',
+            cooking_time=number % 60 + 1
+        )
+        for number in range(total)
+    )
+    IngredientRecipe.objects.bulk_create(
+        IngredientRecipe(
+            recipe=recipe,
+            ingredient=ingredients[(number + shift) % len(ingredients)],
+            amount=shift + 1
+        )
+        for number, recipe in enumerate(recipes)
+        for shift in range(ingredients_per_recipe)
+    )
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe=recipe, tag=tag)
+        for number, recipe in enumerate(recipes)
+        for tag in tags[number % 2:]
+    )
+    AddedToFavorite.objects.bulk_create(
+        AddedToFavorite(user=user, recipe=recipe)
+        for recipe in recipes[::3]
+    )
+    ShoppingСart.objects.bulk_create(
+        ShoppingСart(user=user, recipe=recipe)
+        for recipe in recipes[::4]
+    )
+    Subscribe.objects.bulk_create(
+        Subscribe(user=user, subscribed=author) for author in authors[:2]
+    )
+    return user, authors
+
+
+def make_request(user, query='', path='/api/'):
+    request = Request(
+        RequestFactory().get(f'{path}?{query}', HTTP_HOST='localhost')
+    )
+    request.user = user
+    return request
@@ -0,0 +1,59 @@
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+STOCK_MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+PATHS = ('/api/tags/', '/api/recipes/?limit=6')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures per-request time of API requests through the stock "
+        "middleware stack and the API-scoped one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        for path in PATHS:
+            results = []
+            for label, middleware in (
+                ('stock', STOCK_MIDDLEWARE),
+                ('api-scoped', settings.MIDDLEWARE),
+            ):
+                with override_settings(MIDDLEWARE=middleware):
+                    handler = WSGIHandler()
+                results.append(
+                    (label, *self.measure(handler, path, options['requests']))
+                )
+            baseline = results[0][1]
+            for label, elapsed, queries in results:
+                self.stdout.write(
+                    f'{path:<24} {label:<11} {elapsed:8.1f} us/request '
+                    f'{queries} queries  x{baseline / elapsed:.2f}'
+                )
+
+    def measure(self, handler, path, total):
+        factory = RequestFactory(HTTP_HOST='localhost')
+        handler.get_response(factory.get(path))
+        with CaptureQueriesContext(connection) as captured:
+            handler.get_response(factory.get(path))
+        started = time.perf_counter()
+        for _ in range(total):
+            handler.get_response(factory.get(path))
+        elapsed = (time.perf_counter() - started) / total * 1e6
+        return elapsed, len(captured)
@@ -0,0 +1,103 @@
+import base64
+import io
+import os
+import time
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.management.bench import make_request, populate
+from api.parsers import MessagePackParser, ORJSONParser
+from api.renderes import MessagePackRenderer, ORJSONRenderer
+from api.views import RecipeViewSet
+
+RENDERERS = (
+    ('drf json', JSONRenderer),
+    ('orjson', ORJSONRenderer),
+    ('msgpack', MessagePackRenderer),
+)
+PARSERS = (
+    ('drf json', JSONParser, JSONRenderer),
+    ('orjson', ORJSONParser, JSONRenderer),
+    ('msgpack', MessagePackParser, MessagePackRenderer),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the JSON and MessagePack renderers on a RecipeViewSet.list "
+        "page and the parsers on a recipe-create body with a base64 image."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument(
+            '--image-size', type=int, default=5 * 1024 * 1024,
+            help="Size of the raw image in the create body, in bytes"
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            try:
+                user, _ = populate(options['page_size'])
+                page = self.list_payload(user, options['page_size'])
+            finally:
+                transaction.set_rollback(True)
+        self.stdout.write(
+            f"RecipeViewSet.list, {options['page_size']} recipes per page"
+        )
+        for label, renderer in RENDERERS:
+            self.report(
+                label,
+                lambda: renderer().render(page),
+                options['repeat']
+            )
+        body = self.create_body(options['image_size'])
+        self.stdout.write(
+            f"Recipe create body, {options['image_size']} byte image"
+        )
+        for label, parser, renderer in PARSERS:
+            raw = renderer().render(body)
+            self.report(
+                label,
+                lambda: parser().parse(io.BytesIO(raw)),
+                options['repeat'],
+                size=len(raw)
+            )
+
+    def list_payload(self, user, page_size):
+        request = make_request(
+            user, f'limit={page_size}', path='/api/recipes/'
+        )
+        view = RecipeViewSet.as_view({'get': 'list'})
+        response = view(request._request)
+        return response.data
+
+    def create_body(self, image_size):
+        image = base64.b64encode(os.urandom(image_size)).decode()
+        return {
+            'ingredients': [
+                {'id': number, 'amount': number * 10}
+                for number in range(1, 21)
+            ],
+            'tags': [1, 2],
+            'image': f'data:image/png;base64,{image}',
+            'name': 'Рецепт',
+            'text': 'Описание рецепта ' * 100,
+            'cooking_time': 30,
+        }
+
+    def report(self, label, call, repeat, size=None):
+        output = call()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            call()
+        elapsed = (time.perf_counter() - started) / repeat
+        if size is None:
+            size = len(output)
+        self.stdout.write(
+            f'  {label:<10} {elapsed * 1e3:>9.3f} ms  {size:>10} bytes'
+        )
@@ -0,0 +1,130 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from api.management.bench import make_request, populate
+from api.fast_serializers import (
+    recipe_values, serialize_recipes, serialize_subscriptions
+)
+from api.serializers import (
+    FieldSelection,
+    IngredientSerializer,
+    RecipeGetSerializer,
+    TagSerializer,
+    UserSubscribeSerializer
+)
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+RECIPE_QUERIES = (
+    '',
+    'fields=card',
+    'fields=id,author,tags,ingredients',
+    'fields=id,author,tags&expand=author,tags',
+)
+SUBSCRIPTION_QUERIES = ('', 'recipes_limit=2', 'fields=id,recipes')
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks that the values-based read path renders the same JSON as "
+        "the DRF serializers and compares their per-row cost. Works on "
+        "synthetic data inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=300)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            try:
+                user, authors = populate(options['recipes'])
+                self.compare(user, authors, options['repeat'])
+            finally:
+                transaction.set_rollback(True)
+
+    def measure(self, label, rows, drf, fast, repeat):
+        outputs, timings, queries = [], [], []
+        for render in (drf, fast):
+            reset_queries()
+            with CaptureQueriesContext(connection) as captured:
+                output = JSONRenderer().render(render())
+            started = time.perf_counter()
+            for _ in range(repeat):
+                render()
+            timings.append(
+                (time.perf_counter() - started) / repeat / max(rows, 1)
+            )
+            outputs.append(output)
+            queries.append(len(captured))
+        if outputs[0] != outputs[1]:
+            raise CommandError(f'{label}: fast path output differs')
+        self.stdout.write(
+            f'{label:<48} {rows:>5} rows  '
+            f'drf {timings[0] * 1e6:>8.1f} us/row {queries[0]:>5} queries  '
+            f'fast {timings[1] * 1e6:>7.1f} us/row {queries[1]:>3} queries  '
+            f'x{timings[0] / timings[1]:.1f}'
+        )
+
+    def compare(self, user, authors, repeat):
+        recipes = Recipe.objects.filter(author__in=authors)
+        rows = recipes.count()
+        for query in RECIPE_QUERIES:
+            request = make_request(user, query)
+            selection = FieldSelection(
+                request,
+                RecipeGetSerializer.Meta.fields,
+                RecipeGetSerializer.compact_fields
+            )
+            self.measure(
+                f'recipes ?{query}',
+                rows,
+                lambda: RecipeGetSerializer(
+                    recipes, many=True, context={'request': request}
+                ).data,
+                lambda: serialize_recipes(
+                    recipe_values(recipes), request, selection
+                ),
+                repeat
+            )
+        subscriptions = User.objects.filter(id__in=[a.id for a in authors])
+        for query in SUBSCRIPTION_QUERIES:
+            request = make_request(user, query)
+            selection = FieldSelection(
+                request,
+                UserSubscribeSerializer.Meta.fields,
+                UserSubscribeSerializer.compact_fields
+            )
+            self.measure(
+                f'subscriptions ?{query}',
+                len(authors),
+                lambda: UserSubscribeSerializer(
+                    subscriptions, many=True, context={'request': request}
+                ).data,
+                lambda: serialize_subscriptions(
+                    subscriptions.values(
+                        'email', 'id', 'username', 'first_name', 'last_name'
+                    ),
+                    request,
+                    selection
+                ),
+                repeat
+            )
+        for label, model, serializer in (
+            ('tags', Tag, TagSerializer),
+            ('ingredients', Ingredient, IngredientSerializer),
+        ):
+            queryset = model.objects.all()
+            self.measure(
+                label,
+                queryset.count(),
+                lambda: serializer(queryset, many=True).data,
+                lambda: list(queryset.values(*serializer.Meta.fields)),
+                repeat
+            )
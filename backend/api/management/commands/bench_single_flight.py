@@ -0,0 +1,66 @@
+import threading
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+from api.views import RecipeViewSet
+from recipes.documents import bump_version
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends simultaneous requests for an expired recipe list and checks "
+        "that the database computes it once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=200)
+
+    def handle(self, *args, **options):
+        clients = options['clients']
+        view = RecipeViewSet.as_view({'get': 'list'})
+        barrier = threading.Barrier(clients)
+        lock = threading.Lock()
+        computations = []
+        statuses = []
+
+        def count(execute, sql, params, many, context):
+            if 'COUNT(' in sql and 'recipes_recipe' in sql:
+                with lock:
+                    computations.append(sql)
+            return execute(sql, params, many, context)
+
+        def client():
+            request = RequestFactory().get(
+                '/api/recipes/', HTTP_HOST='localhost'
+            )
+            request.user = AnonymousUser()
+            try:
+                with connection.execute_wrapper(count):
+                    barrier.wait()
+                    response = view(request)
+                with lock:
+                    statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        # Новая версия документов делает все закэшированные ответы
+        # недействительными: все клиенты попадают в промах.
+        bump_version()
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{clients} simultaneous misses: {len(computations)} database '
+            f'computations, statuses {sorted(set(statuses))}, '
+            f'{elapsed:.2f}s'
+        )
+        if len(computations) != 1 or set(statuses) != {200}:
+            raise CommandError('Expected exactly one computation')
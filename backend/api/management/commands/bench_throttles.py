@@ -0,0 +1,79 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import BaseCommand
+from rest_framework.settings import api_settings
+from rest_framework.throttling import ScopedRateThrottle
+
+from api.management.bench import make_request
+from api.throttling import CACHE_PREFIX, TokenBucketThrottle
+from users.models import User
+
+SCOPE = 'bench'
+
+
+class View:
+    throttle_scope = SCOPE
+    action = 'list'
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures per-request overhead of TokenBucketThrottle against "
+        "DRF's ScopedRateThrottle on the configured cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100000)
+        parser.add_argument('--clients', type=int, default=100)
+
+    def handle(self, *args, **options):
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        rates[SCOPE] = f"{options['requests'] * 10}/s"
+        ScopedRateThrottle.THROTTLE_RATES = rates
+        requests = []
+        for number in range(options['clients']):
+            if number % 2:
+                request = make_request(AnonymousUser())
+                request._request.META['REMOTE_ADDR'] = f'10.0.0.{number}'
+            else:
+                request = make_request(User(pk=number))
+            requests.append(request)
+        try:
+            for label, throttle in (
+                ('token bucket', TokenBucketThrottle),
+                ('drf scoped', ScopedRateThrottle),
+            ):
+                self.report(label, throttle, requests, options['requests'])
+        finally:
+            del rates[SCOPE]
+            self.cleanup(requests)
+
+    def cleanup(self, requests):
+        # Кэш общий с работающим приложением, поэтому удаляются только
+        # счётчики клиентов бенчмарка.
+        scoped = ScopedRateThrottle()
+        scoped.scope = SCOPE
+        keys = []
+        for request in requests:
+            key, _ = TokenBucketThrottle().get_key_and_rate(request, SCOPE)
+            keys.append(f'{CACHE_PREFIX}:{key}')
+            keys.append(scoped.get_cache_key(request, View()))
+            with TokenBucketThrottle.lock:
+                TokenBucketThrottle.buckets.pop(key, None)
+        cache.delete_many(keys)
+
+    def report(self, label, throttle, requests, total):
+        view = View()
+        started = time.perf_counter()
+        allowed = 0
+        for number in range(total):
+            allowed += throttle().allow_request(
+                requests[number % len(requests)], view
+            )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{label:14} {elapsed / total * 1e6:8.2f} us/request  "
+            f"{allowed}/{total} allowed"
+        )
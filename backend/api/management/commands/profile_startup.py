@@ -0,0 +1,148 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+# Выполняется в отдельном интерпретаторе, чтобы ничего не было
+# импортировано заранее: оборачивает ready() каждого приложения и
+# замеряет django.setup(), WSGI-приложение и загрузку URLconf.
+STARTUP_SCRIPT = '''
+import json
+import time
+
+started = time.perf_counter()
+import django
+from django.apps.config import AppConfig
+
+ready_timings = {}
+create = AppConfig.create.__func__
+
+
+def timed_create(cls, entry):
+    app_config = create(cls, entry)
+    ready = app_config.ready
+
+    def timed_ready():
+        begin = time.perf_counter()
+        ready()
+        ready_timings[app_config.label] = time.perf_counter() - begin
+
+    app_config.ready = timed_ready
+    return app_config
+
+
+AppConfig.create = classmethod(timed_create)
+django.setup()
+setup = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
+
+get_wsgi_application()
+get_resolver().url_patterns
+print(json.dumps({
+    'setup': setup - started,
+    'urls': time.perf_counter() - setup,
+    'ready': ready_timings,
+}))
+'''
+
+
+class ImportNode:
+    def __init__(self, name, own, total):
+        self.name = name
+        self.own = own
+        self.total = total
+        self.children = []
+
+
+def parse_import_times(output):
+    # -X importtime печатает модуль после всех его зависимостей, а
+    # вложенность обозначает отступом по два пробела на уровень.
+    pending = {}
+    for line in output.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match is None:
+            continue
+        own, total, indent, name = match.groups()
+        depth = len(indent) // 2
+        node = ImportNode(name, int(own) / 1000, int(total) / 1000)
+        node.children = pending.pop(depth + 1, [])
+        pending.setdefault(depth, []).append(node)
+    return pending.get(0, [])
+
+
+class Command(BaseCommand):
+    help = (
+        "Starts the project in a fresh interpreter and reports import "
+        "times as a tree plus AppConfig.ready() timings; fails when "
+        "startup exceeds the budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--budget', type=float, default=settings.STARTUP_BUDGET_MS,
+            help="Maximum startup time in milliseconds"
+        )
+        parser.add_argument('--depth', type=int, default=3)
+        parser.add_argument(
+            '--min-ms', type=float, default=5,
+            help="Hide modules cheaper than this"
+        )
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            filter(None, [str(settings.BASE_DIR), env.get('PYTHONPATH')])
+        )
+        started = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR
+        )
+        elapsed = (time.perf_counter() - started) * 1000
+        if process.returncode:
+            raise CommandError(process.stderr[-2000:])
+        timings = json.loads(process.stdout.splitlines()[-1])
+        self.stdout.write("Imports, cumulative ms (own ms):")
+        for node in sorted(
+            parse_import_times(process.stderr),
+            key=lambda node: node.total, reverse=True
+        ):
+            self.write_node(node, 0, options['depth'], options['min_ms'])
+        self.stdout.write("AppConfig.ready(), ms:")
+        for label, seconds in sorted(
+            timings['ready'].items(), key=lambda item: item[1], reverse=True
+        ):
+            self.stdout.write(f"  {label:20} {seconds * 1000:8.1f}")
+        self.stdout.write(
+            f"django.setup() {timings['setup'] * 1000:.1f} ms, "
+            f"WSGI and URLconf {timings['urls'] * 1000:.1f} ms, "
+            f"process total {elapsed:.1f} ms "
+            f"(budget {options['budget']:.0f} ms)"
+        )
+        if elapsed > options['budget']:
+            raise CommandError(
+                f"Старт занял {elapsed:.0f} мс, бюджет "
+                f"{options['budget']:.0f} мс"
+            )
+
+    def write_node(self, node, depth, max_depth, min_ms):
+        if node.total < min_ms:
+            return
+        self.stdout.write(
+            f"{'  ' * (depth + 1)}{node.name:{50 - 2 * depth}} "
+            f"{node.total:8.1f} ({node.own:.1f})"
+        )
+        if depth + 1 >= max_depth:
+            return
+        for child in sorted(
+            node.children, key=lambda child: child.total, reverse=True
+        ):
+            self.write_node(child, depth + 1, max_depth, min_ms)
@@ -1,52 +1,196 @@
 from django.contrib.auth import get_user_model
 from django.http import Http404
 from rest_framework.permissions import IsAuthenticated
+from django.db.transaction import atomic
 from django.shortcuts import get_object_or_404
 from rest_framework import status
-from rest_framework.mixins import (
-    CreateModelMixin,
-    DestroyModelMixin,
-    ListModelMixin,
-    RetrieveModelMixin,
-)
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.viewsets import GenericViewSet
+from rest_framework.viewsets import GenericViewSet, ViewSet
+
+from recipes.changes import log
+from recipes.models import Change
+from recipes.reference import reference_data
 
 User = get_user_model()
 
 
-class ListRetrieveViewSet(GenericViewSet, ListModelMixin, RetrieveModelMixin):
-    pass
+class ReferenceListRetrieveViewSet(GenericViewSet):
+    # Справочник отдаётся из снимка в памяти процесса, без запросов.
+    reference = None
+    search_field = None
+    search_param = 'name'
+
+    def get_snapshot(self):
+        return getattr(reference_data, self.reference)
+
+    def list(self, request, *args, **kwargs):
+        snapshot = self.get_snapshot()
+        terms = request.query_params.get(self.search_param, '')
+        terms = terms.replace(',', ' ').split()
+        if self.search_field is None or not terms:
+            return Response(snapshot.as_dicts())
+        return Response(
+            snapshot.as_dicts(snapshot.search(self.search_field, terms))
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            row = self.get_snapshot().get(int(self.kwargs['pk']))
+        except ValueError:
+            row = None
+        if row is None:
+            raise Http404
+        return Response(row)
+
+
+class RelationshipChangeMixin:
+    change_kind = None
+
+    def relation_changed(self, target_ids, added):
+        if self.change_kind is None:
+            return
+        log(
+            self.request.user.id,
+            self.change_kind,
+            Change.ADD if added else Change.REMOVE,
+            target_ids
+        )
 
 
-class CreateDestroyRelationshipViewSet(
-    GenericViewSet, CreateModelMixin, DestroyModelMixin
-):
+class CreateDestroyRelationshipViewSet(RelationshipChangeMixin, ViewSet):
     permission_classes = (IsAuthenticated,)
+    throttle_scope = 'relationship_write'
+    model = None
+    field = None
+    target_fields = ()
+    lookup_url_kwarg = None
+    not_found_status = status.HTTP_400_BAD_REQUEST
+    not_found_message = 'Объект не найден'
+    exists_message = None
+    absent_message = None
 
-    def create(
-        self, request, field, key, post_serializer, model, *args, **kwargs
-    ):
-        request.data.update({field: kwargs[key]})
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
-        object = post_serializer(
-            instance=model.objects.get(id=self.kwargs[key]),
-            context={'request': request}
+    def get_target_id(self):
+        return int(self.kwargs[self.lookup_url_kwarg])
+
+    def validate_target(self, target_id):
+        pass
+
+    def get_target_model(self):
+        return self.model._meta.get_field(self.field).related_model
+
+    def get_target_row(self, target_id):
+        return self.get_target_model().objects.filter(id=target_id).values(
+            *self.target_fields
+        ).first()
+
+    def to_representation(self, row):
+        return row
+
+    def create(self, request, *args, **kwargs):
+        target_id = self.get_target_id()
+        self.validate_target(target_id)
+        row = self.get_target_row(target_id)
+        if row is None:
+            return Response(
+                {'errors': self.not_found_message},
+                status=self.not_found_status
+            )
+        with atomic():
+            added = self.model.objects.add(
+                request.user, self.field, target_id
+            )
+            if added:
+                self.relation_changed([target_id], added=True)
+        if not added:
+            return Response(
+                {'errors': self.exists_message},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            self.to_representation(row), status=status.HTTP_201_CREATED
         )
-        headers = self.get_success_headers(object.data)
+
+    def delete(self, request, *args, **kwargs):
+        target_id = self.get_target_id()
+        with atomic():
+            removed = self.model.objects.remove(
+                request.user, self.field, target_id
+            )
+            if removed:
+                self.relation_changed([target_id], added=False)
+        if removed:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(self.get_target_model(), id=target_id)
         return Response(
-            object.data, status=status.HTTP_201_CREATED, headers=headers
+            {'errors': self.absent_message},
+            status=status.HTTP_400_BAD_REQUEST
         )
 
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
 
-    def delete(self, request, model, key, *args, **kwargs):
-        get_object_or_404(model, id=self.kwargs[key])
-        try:
-            self.get_object()
-        except Http404:
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-        return self.destroy(request, *args, **kwargs)
+class BatchRelationshipViewSet(RelationshipChangeMixin, GenericViewSet):
+    permission_classes = (IsAuthenticated,)
+    throttle_scope = 'relationship_write'
+    model = None
+    target_model = None
+    field = None
+
+    def get_ids(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return list(dict.fromkeys(serializer.validated_data['ids']))
+
+    def get_forbidden_ids(self):
+        return set()
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        # Статусы, журнал изменений и оценки считаются по строкам, которые
+        # вернули INSERT и DELETE: при гонке двух запросов связь создаёт и
+        # удаляет ровно один из них.
+        ids = self.get_ids(request)
+        forbidden = self.get_forbidden_ids()
+        with atomic():
+            created = self.model.objects.add_many(
+                request.user, self.field,
+                [id for id in ids if id not in forbidden]
+            )
+            self.relation_changed(
+                [id for id in ids if id in created], added=True
+            )
+        existing = set(
+            self.target_model.objects.filter(
+                id__in=[id for id in ids if id not in created]
+            ).values_list('id', flat=True)
+        )
+        results = []
+        for id in ids:
+            if id in forbidden:
+                result = 'invalid'
+            elif id in created:
+                result = 'created'
+            elif id in existing:
+                result = 'exists'
+            else:
+                result = 'not_found'
+            results.append({'id': id, 'status': result})
+        return Response(results, status=status.HTTP_200_OK)
+
+    @batch.mapping.delete
+    def batch_delete(self, request):
+        ids = self.get_ids(request)
+        with atomic():
+            deleted = self.model.objects.remove_many(
+                request.user, self.field, ids
+            )
+            self.relation_changed(
+                [id for id in ids if id in deleted], added=False
+            )
+        return Response(
+            [
+                {'id': id, 'status': 'deleted' if id in deleted
+                 else 'not_found'}
+                for id in ids
+            ],
+            status=status.HTTP_200_OK
+        )
@@ -0,0 +1,156 @@
+import logging
+import os
+import re
+import sys
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.fields import Field
+
+STACK_DEPTH = 8
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_RE = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+SPACE_RE = re.compile(r'\s+')
+
+logger = logging.getLogger(__name__)
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = IN_RE.sub('IN (...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def _is_project_file(filename):
+    filename = os.path.abspath(filename)
+    return (
+        filename.startswith(str(settings.BASE_DIR))
+        and 'site-packages' not in filename
+        and filename != os.path.abspath(__file__)
+    )
+
+
+def _inspect_stack():
+    # Источник запроса — ближайшее поле сериализатора на стеке: для
+    # SerializerMethodField это и есть метод get_<имя поля>.
+    origin = None
+    stack = []
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        field = frame.f_locals.get('self')
+        if (
+            origin is None
+            and isinstance(field, Field)
+            and code.co_name in ('to_representation', 'get_attribute')
+            and field.parent is not None
+        ):
+            origin = f'{type(field.parent).__name__}.{field.field_name}'
+        if (
+            len(stack) < STACK_DEPTH
+            and _is_project_file(code.co_filename)
+        ):
+            stack.append(
+                f'{os.path.relpath(code.co_filename, settings.BASE_DIR)}:'
+                f'{frame.f_lineno} in {code.co_name}'
+            )
+        frame = frame.f_back
+    return origin, stack
+
+
+class Detector:
+    # Считает одинаковые с точностью до параметров запросы. Когда
+    # запрос повторился больше threshold раз, запоминается место, где
+    # это случилось, а в строгом режиме сразу выбрасывается ошибка.
+
+    def __init__(self, threshold=None, raise_on_detect=False):
+        self.threshold = threshold or settings.NPLUSONE_THRESHOLD
+        self.raise_on_detect = raise_on_detect
+        self.counts = Counter()
+        self.problems = {}
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        key = fingerprint(sql)
+        self.counts[key] += 1
+        if self.counts[key] == self.threshold + 1:
+            origin, stack = _inspect_stack()
+            self.problems[key] = {'origin': origin, 'stack': stack}
+            if self.raise_on_detect:
+                raise NPlusOneError(self.format(key))
+        return execute(sql, params, many, context)
+
+    def format(self, key):
+        problem = self.problems[key]
+        return '\n'.join([
+            f'N+1: query repeated {self.counts[key]} times '
+            f'in {problem["origin"] or "unknown field"}',
+            f'    {key}',
+            *[f'    {line}' for line in problem['stack']],
+        ])
+
+    def report(self):
+        return '\n'.join(self.format(key) for key in self.problems)
+
+
+class NPlusOneMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with Detector(raise_on_detect=settings.NPLUSONE_RAISE) as detector:
+            response = self.get_response(request)
+        if detector.problems:
+            logger.warning(
+                '%s %s\n%s', request.method, request.get_full_path(),
+                detector.report()
+            )
+        return response
+
+
+class _DetectingHandler:
+    def __init__(self, handler, threshold):
+        object.__setattr__(self, 'handler', handler)
+        object.__setattr__(self, 'threshold', threshold)
+
+    def __call__(self, *args, **kwargs):
+        with Detector(self.threshold, raise_on_detect=True):
+            return self.handler(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.handler, name)
+
+    def __setattr__(self, name, value):
+        # APIClient.force_authenticate пишет атрибуты в обработчик.
+        setattr(self.handler, name, value)
+
+
+class NPlusOneTestMixin:
+    # Для TestCase: каждый запрос через self.client падает с
+    # NPlusOneError, если в нём есть N+1. Запросы при подготовке данных
+    # в самом тесте не проверяются.
+    nplusone_threshold = None
+
+    def setUp(self):
+        super().setUp()
+        self.client.handler = _DetectingHandler(
+            self.client.handler, self.nplusone_threshold
+        )
@@ -12,5 +12,5 @@ class IsAuthorOrReadOnly(BasePermission):
     def has_object_permission(self, request, view, obj):
         return (
             request.method in SAFE_METHODS
-            or request.user == obj.author
+            or request.user.id == obj.author_id
         )
@@ -0,0 +1,215 @@
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, defaultdict
+
+import orjson
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+PARAM = 'profile'
+HEADER = 'X-Profile'
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_name(code):
+    filename = code.co_filename
+    if filename.startswith(str(settings.BASE_DIR)):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class Sampler(threading.Thread):
+    # Раз в interval снимает стек потока запроса. Результат — свёрнутые
+    # стеки («кадр;кадр;кадр число»), их понимают flamegraph.pl и
+    # speedscope. Частота ограничена интервалом переключения GIL.
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def folded(self):
+        return '\n'.join(
+            f'{stack} {count}' for stack, count in self.stacks.most_common()
+        )
+
+
+class Profile:
+    # tracemalloc общий на процесс: пока один запрос снимает память,
+    # другие профилируются без неё, а в снимок попадают и выделения
+    # соседних потоков.
+    memory_lock = threading.Lock()
+
+    def __init__(self, memory=False):
+        self.memory = memory and self.memory_lock.acquire(blocking=False)
+        self.sampler = Sampler(
+            threading.get_ident(), settings.PROFILING_INTERVAL
+        )
+        self.allocations = None
+        self.duration = None
+
+    def __enter__(self):
+        if self.memory:
+            tracemalloc.start()
+        self._started = time.perf_counter()
+        self.sampler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.sampler.stop()
+        self.duration = time.perf_counter() - self._started
+        if self.memory:
+            try:
+                snapshot = tracemalloc.take_snapshot().filter_traces([
+                    tracemalloc.Filter(False, __file__),
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                ])
+            finally:
+                tracemalloc.stop()
+                self.memory_lock.release()
+            self.allocations = [
+                {
+                    'location': str(statistic.traceback),
+                    'size': statistic.size,
+                    'count': statistic.count,
+                }
+                for statistic in snapshot.statistics('lineno')[
+                    :settings.PROFILING_TOP_ALLOCATIONS
+                ]
+            ]
+
+    def as_dict(self, request, response):
+        return {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'duration': self.duration,
+            'samples': sum(self.sampler.stacks.values()),
+            'allocations': self.allocations,
+        }
+
+
+def _prune(directory, keep):
+    profiles = sorted(
+        entry.path for entry in os.scandir(directory)
+        if entry.name.endswith('.json')
+    )
+    for profile in profiles[:-keep]:
+        for path in (profile, profile[:-len('.json')] + '.folded'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def store(profile, request, response):
+    # Имена начинаются с времени, поэтому старые профили удаляются по
+    # порядку имён, и в каталоге остаются последние PROFILING_KEEP.
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    name = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}'
+    path = os.path.join(directory, name)
+    with open(f'{path}.folded', 'w') as file:
+        file.write(profile.sampler.folded())
+    with open(f'{path}.json', 'wb') as file:
+        file.write(orjson.dumps(profile.as_dict(request, response)))
+    _prune(directory, settings.PROFILING_KEEP)
+    return name
+
+
+class ProfilingMiddleware:
+    # Сотрудник включает профилирование запроса параметром ?profile= или
+    # заголовком X-Profile. Значение — список через запятую: memory
+    # добавляет топ выделений памяти, inline возвращает профиль вместо
+    # ответа. Кроме того, при PROFILING_SAMPLE_EVERY = N профилируется
+    # каждый N-й запрос к каждому маршруту. Без PROFILING_ENABLED слой
+    # не подключается вовсе.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.lock = threading.Lock()
+        self.counters = defaultdict(int)
+
+    def requested_options(self, request):
+        value = request.GET.get(PARAM) or request.headers.get(HEADER)
+        if not value:
+            return None
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            # Запросы к API не проходят через AuthenticationMiddleware,
+            # поэтому пользователь определяется аутентификацией DRF.
+            try:
+                user = Request(
+                    request,
+                    authenticators=[
+                        authentication()
+                        for authentication
+                        in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+                    ]
+                ).user
+            except APIException:
+                return None
+        if not user.is_staff:
+            return None
+        return set(value.split(','))
+
+    def is_sampled(self, request):
+        if not settings.PROFILING_SAMPLE_EVERY:
+            return False
+        try:
+            route = resolve(request.path_info).route
+        except Resolver404:
+            return False
+        key = f'{request.method} {route}'
+        with self.lock:
+            self.counters[key] += 1
+            return self.counters[key] % settings.PROFILING_SAMPLE_EVERY == 0
+
+    def __call__(self, request):
+        options = self.requested_options(request)
+        if options is None and not self.is_sampled(request):
+            return self.get_response(request)
+        options = options or set()
+        with Profile(memory='memory' in options) as profile:
+            response = self.get_response(request)
+        if 'inline' in options:
+            return HttpResponse(
+                orjson.dumps({
+                    **profile.as_dict(request, response),
+                    'stacks': profile.sampler.folded(),
+                }),
+                content_type='application/json'
+            )
+        name = store(profile, request, response)
+        response['X-Profile-Id'] = name
+        logger.info('%s %s profiled as %s', request.method,
+                    request.get_full_path(), name)
+        return response
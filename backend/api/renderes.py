@@ -1,5 +1,52 @@
-from rest_framework_csv.renderers import CSVRenderer
+import orjson
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
 
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
 
-class ShoppingCartRenderer(CSVRenderer):
+encode_default = JSONEncoder().default
+
+
+class ShoppingCartRenderer(BaseRenderer):
+    # rest_framework_csv нужен только при скачивании списка покупок,
+    # поэтому импортируется при первом рендере, а не при старте воркера.
+    media_type = 'text/csv'
+    format = 'csv'
     header = ['Название', 'Количество', 'Единица измерения']
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        from rest_framework_csv.renderers import CSVRenderer
+
+        renderer = CSVRenderer()
+        renderer.header = self.header
+        return renderer.render(
+            data, accepted_media_type, renderer_context or {}
+        )
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        options = ORJSON_OPTIONS
+        if accepted_media_type and 'indent=' in accepted_media_type:
+            options |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=encode_default, option=options)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        import msgpack
+
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
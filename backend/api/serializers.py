@@ -1,25 +1,87 @@
 import base64
+from functools import partial
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
-from django.db.transaction import atomic
+from django.db.transaction import atomic, on_commit
 from djoser.serializers import (
     UserCreateSerializer, UserSerializer
 )
-from django.shortcuts import get_object_or_404
 from rest_framework import serializers
 from rest_framework.relations import SlugRelatedField
 from rest_framework.serializers import ValidationError
-from rest_framework.validators import UniqueTogetherValidator
 
+from .images import variant_urls
+from .tasks import render_image_variants
 from recipes.models import (
     Ingredient, IngredientRecipe, AddedToFavorite,
     Recipe, ShoppingСart, Subscribe, Tag
 )
+from recipes.documents import compose, save as save_document
+from recipes.reference import reference_data
+from recipes.signals import ingredients_changed
+
+BATCH_LIMIT = 100
+FIELD_PRESETS = {
+    'card': (
+        'id', 'name', 'image', 'image_variants', 'cooking_time',
+        'is_favorited', 'is_in_shopping_cart',
+    ),
+}
 
 User = get_user_model()
 
 
+class FieldSelection:
+    # ?fields=a,b или пресет (?fields=card) ограничивает набор полей.
+    # Вложенные объекты при этом отдаются id, если их нет в ?expand=.
+    # Без ?fields= представление полное, как раньше.
+
+    def __init__(self, request, fields, expandable=()):
+        params = getattr(request, 'query_params', {})
+        requested = params.get('fields')
+        if not requested:
+            self.fields = set(fields)
+            self.expand = set(expandable)
+            self.sparse = False
+            return
+        names = set()
+        for name in requested.split(','):
+            name = name.strip()
+            names.update(FIELD_PRESETS.get(name, (name,)))
+        self.fields = names & set(fields)
+        self.expand = {
+            name.strip() for name in params.get('expand', '').split(',')
+        } & set(expandable)
+        self.sparse = True
+
+    def __contains__(self, name):
+        return name in self.fields
+
+    def is_compact(self, name):
+        return name in self.fields and name not in self.expand
+
+
+class SparseFieldsMixin:
+    compact_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selection = FieldSelection(
+            self.context.get('request'),
+            self.Meta.fields,
+            self.compact_fields
+        )
+        if not selection.sparse:
+            return
+        for name in set(self.fields) - selection.fields:
+            self.fields.pop(name)
+        for name, field in self.compact_fields.items():
+            if selection.is_compact(name):
+                self.fields[name] = field()
+
+
 class UserPostSerializer(UserCreateSerializer):
 
     class Meta:
@@ -50,7 +112,14 @@ class RecipeAddSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class UserSubscribeSerializer(serializers.ModelSerializer):
+class UserSubscribeSerializer(
+    SparseFieldsMixin, serializers.ModelSerializer
+):
+    compact_fields = {
+        'recipes': lambda: serializers.SerializerMethodField(
+            method_name='get_recipe_ids'
+        ),
+    }
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.IntegerField(
@@ -75,15 +144,20 @@ class UserSubscribeSerializer(serializers.ModelSerializer):
             user=user.id, subscribed=obj.id
         ).exists()
 
-    def get_recipes(self, obj):
+    def limit_recipes(self, obj):
         try:
             recipes_limit = (
                 int(self.context['request'].query_params['recipes_limit'])
             )
-            recipes = obj.recipes.all()[:recipes_limit]
+            return obj.recipes.all()[:recipes_limit]
         except KeyError:
-            recipes = obj.recipes.all()
-        return RecipeAddSerializer(recipes, many=True).data
+            return obj.recipes.all()
+
+    def get_recipes(self, obj):
+        return RecipeAddSerializer(self.limit_recipes(obj), many=True).data
+
+    def get_recipe_ids(self, obj):
+        return [recipe.id for recipe in self.limit_recipes(obj)]
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -107,9 +181,7 @@ class IngredientPostSerializer(serializers.Serializer):
     def validate_id(self, value):
         if not value:
             raise ValidationError('Пожалуйста, добавьте ингредиенты')
-        try:
-            Ingredient.objects.get(id=value)
-        except Ingredient.DoesNotExist:
+        if value not in reference_data.ingredients:
             raise ValidationError(
                 'Пожалуйста, выбирайте только ингредиенты из списка'
             )
@@ -128,21 +200,6 @@ class IngredientPostSerializer(serializers.Serializer):
         return value
 
 
-class IngredientGetSerializer(serializers.ModelSerializer):
-    amount = serializers.SerializerMethodField(default=1)
-
-    class Meta:
-        model = Ingredient
-        fields = ('id', 'name', 'measurement_unit', 'amount',)
-
-    def get_amount(self, obj):
-        recipe = self.context['recipe']
-        return get_object_or_404(
-            IngredientRecipe,
-            recipe=recipe, ingredient=obj
-        ).amount
-
-
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
@@ -168,7 +225,25 @@ def irngredientrecipe_create(ingredients, instance):
     IngredientRecipe.objects.bulk_create(relationship)
 
 
-def validate_dublicate(values, object, model):
+class ReferenceTagField(serializers.PrimaryKeyRelatedField):
+    # Теги проверяются по снимку справочника, без запроса к базе.
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            row = reference_data.tags.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if row is None:
+            self.fail('does_not_exist', pk_value=data)
+        tag = Tag(**row)
+        tag._state.adding = False
+        tag._state.db = self.get_queryset().db
+        return tag
+
+
+def validate_dublicate(values, object, snapshot):
     ids = []
     for value in values:
         try:
@@ -179,13 +254,13 @@ def validate_dublicate(values, object, model):
             ids.append(id)
         else:
             raise ValidationError(
-                f'{object} {model.objects.get(id=id).name} '
+                f"{object} {snapshot.field(id, 'name')} "
                 'повторяется. Пожалуйста, удалите дубликат'
             )
 
 
 class RecipePostSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = ReferenceTagField(
         queryset=Tag.objects.all(),
         required=True,
         many=True
@@ -222,12 +297,13 @@ class RecipePostSerializer(serializers.ModelSerializer):
         validate_dublicate(
             values=ingredients,
             object='Ингредиент',
-            model=Ingredient
+            snapshot=reference_data.ingredients
         )
         validate_dublicate(
             values=tags,
             object='Тег',
-            model=Tag)
+            snapshot=reference_data.tags
+        )
         return super().validate(attrs)
 
     def validate_ingredients(self, values):
@@ -242,6 +318,33 @@ class RecipePostSerializer(serializers.ModelSerializer):
             raise ValidationError('Пожалуйста, укажите хотя бы один тег')
         return values
 
+    def save_document(self, recipe, tags, ingredients):
+        # Ответ и документ собираются из проверенных данных и снимка
+        # справочников, без повторного чтения только что записанного.
+        # Автор — текущий пользователь: чужой рецепт IsAuthorOrReadOnly
+        # изменить не даст.
+        snapshot = reference_data.ingredients
+        save_document(recipe, compose(
+            recipe,
+            self.context['request'].user,
+            [(tag.id, tag.name, tag.color, tag.slug) for tag in tags],
+            [
+                (
+                    ingredient['id'],
+                    snapshot.field(ingredient['id'], 'name'),
+                    snapshot.field(ingredient['id'], 'measurement_unit'),
+                    ingredient['amount']
+                )
+                for ingredient in ingredients
+            ]
+        ))
+
+    def set_tags(self, recipe, tags):
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+            for tag in tags
+        )
+
     @atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
@@ -251,29 +354,63 @@ class RecipePostSerializer(serializers.ModelSerializer):
             ingredients=ingredients,
             instance=recipe
         )
-        recipe.tags.set(tags)
+        self.set_tags(recipe, tags)
+        self.save_document(recipe, tags, ingredients)
+        render_image_variants.delay(name=recipe.image.name)
+        on_commit(partial(
+            ingredients_changed.send,
+            sender=Recipe,
+            recipe_id=recipe.id,
+            ingredient_ids=[ingredient['id'] for ingredient in ingredients]
+        ))
         return recipe
 
     @atomic
     def update(self, instance, validated_data):
         instance.tags.clear()
+        tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
+        previous = set(
+            instance.ingredients.values_list('id', flat=True)
+        )
         instance.ingredients.clear()
         irngredientrecipe_create(
             ingredients=ingredients,
             instance=instance
         )
-        instance.save()
-        return super().update(instance, validated_data)
-
-
-class RecipeGetSerializer(serializers.ModelSerializer):
+        self.set_tags(instance, tags)
+        current = [ingredient['id'] for ingredient in ingredients]
+        if previous != set(current):
+            on_commit(partial(
+                ingredients_changed.send,
+                sender=Recipe,
+                recipe_id=instance.id,
+                ingredient_ids=current
+            ))
+        instance = super().update(instance, validated_data)
+        self.save_document(instance, tags, ingredients)
+        if 'image' in validated_data:
+            render_image_variants.delay(name=instance.image.name)
+        return instance
+
+
+class RecipeGetSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    compact_fields = {
+        'tags': lambda: serializers.PrimaryKeyRelatedField(
+            many=True, read_only=True
+        ),
+        'author': lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+        'ingredients': lambda: serializers.SerializerMethodField(
+            method_name='get_ingredient_amounts'
+        ),
+    }
     tags = TagSerializer(many=True)
     author = UserGetSerializer(read_only=True)
     ingredients = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -286,16 +423,34 @@ class RecipeGetSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
         )
 
     def get_ingredients(self, obj):
-        context = getattr(self, 'context', {})
-        context['recipe'] = obj
-        return IngredientGetSerializer(
-            obj.ingredients.all(), many=True, context=context
-        ).data
+        return [
+            {
+                **IngredientSerializer(relation.ingredient).data,
+                'amount': relation.amount
+            }
+            for relation in sorted(
+                obj.ingredientrecipe_set.all(),
+                key=lambda relation: relation.ingredient_id
+            )
+        ]
+
+    def get_ingredient_amounts(self, obj):
+        return [
+            {'id': relation.ingredient_id, 'amount': relation.amount}
+            for relation in sorted(
+                obj.ingredientrecipe_set.all(),
+                key=lambda relation: relation.ingredient_id
+            )
+        ]
+
+    def get_image_variants(self, obj):
+        return variant_urls(obj.image.name, self.context.get('request'))
 
     def get_is_favorited(self, obj):
         user = self.context['request'].user
@@ -310,66 +465,26 @@ class RecipeGetSerializer(serializers.ModelSerializer):
         ).exists()
 
 
-class SubscribeSerializer(serializers.ModelSerializer):
-    user = serializers.PrimaryKeyRelatedField(
-        read_only=True,
-        default=serializers.CurrentUserDefault(),
-    )
-    subscribed = serializers.PrimaryKeyRelatedField(
-        queryset=User.objects.all()
+class BatchSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BATCH_LIMIT
     )
 
-    class Meta:
-        fields = ('id', 'user', 'subscribed')
-        model = Subscribe
 
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Subscribe.objects.all(),
-                fields=('user', 'subscribed')
-            )
-        ]
-
-    def validate_subscribed(self, obj):
-        if obj == self.context['request'].user:
-            raise serializers.ValidationError()
-        return obj
-
-
-class FavoriteSerializer(serializers.ModelSerializer):
-    user = SlugRelatedField(
-        read_only=True, default=serializers.CurrentUserDefault(),
-        slug_field='username'
+class CookableQuerySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False
     )
-    recipe = serializers.PrimaryKeyRelatedField(queryset=Recipe.objects.all())
-
-    class Meta:
-        fields = ('id', 'user', 'recipe')
-        model = AddedToFavorite
-
-        validators = [
-            UniqueTogetherValidator(
-                queryset=AddedToFavorite.objects.all(),
-                fields=('user', 'recipe')
-            )
-        ]
+    max_missing = serializers.IntegerField(min_value=0, required=False)
 
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
-    user = SlugRelatedField(
-        read_only=True,
-        default=serializers.CurrentUserDefault(),
-        slug_field='username'
+class ChangesQuerySerializer(serializers.Serializer):
+    since = serializers.IntegerField(min_value=0, required=False)
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.CHANGES_MAX_PAGE_SIZE,
+        default=settings.CHANGES_PAGE_SIZE
     )
-    recipe = serializers.PrimaryKeyRelatedField(queryset=Recipe.objects.all())
-
-    class Meta:
-        fields = ('id', 'user', 'recipe')
-        model = ShoppingСart
-
-        validators = [
-            UniqueTogetherValidator(
-                queryset=ShoppingСart.objects.all(),
-                fields=('user', 'recipe')
-            )
-        ]
@@ -0,0 +1,8 @@
+from jobs.queue import task
+
+
+@task()
+def render_image_variants(name):
+    from .images import render_variants
+
+    render_variants(name)
@@ -0,0 +1,88 @@
+import multiprocessing
+import time
+
+from django.core.cache import cache
+from django.db import connections
+from django.test import TransactionTestCase
+
+from api.caching import single_flight
+from recipes.documents import bump_version, current_version
+
+KEY = 'test:single-flight'
+PROCESSES = 200
+COMPUTE_SECONDS = 0.5
+
+
+def fetch(key, barrier, computations, results):
+    def compute():
+        with computations.get_lock():
+            computations.value += 1
+        time.sleep(COMPUTE_SECONDS)
+        return 'value'
+
+    try:
+        barrier.wait()
+        results.put(single_flight(key, compute, 60))
+    finally:
+        connections.close_all()
+
+
+def bump():
+    try:
+        bump_version()
+    finally:
+        connections.close_all()
+
+
+class SingleFlightTests(TransactionTestCase):
+    # Воркеры gunicorn — отдельные процессы, поэтому проверка идёт в
+    # процессах, а не в потоках одного процесса, у которых кэш общий
+    # при любом бэкенде.
+
+    def setUp(self):
+        cache.delete_many([KEY, f'{KEY}:lock'])
+        self.addCleanup(cache.delete_many, [KEY, f'{KEY}:lock'])
+
+    def run_processes(self, target, args, count):
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=target, args=args) for _ in range(count)
+        ]
+        for process in processes:
+            process.start()
+        return processes
+
+    def join(self, processes):
+        for process in processes:
+            process.join(30)
+            self.assertEqual(process.exitcode, 0)
+
+    def test_misses_are_computed_once_across_processes(self):
+        context = multiprocessing.get_context('fork')
+        barrier = context.Barrier(PROCESSES)
+        computations = context.Value('i', 0)
+        results = context.Queue()
+        processes = self.run_processes(
+            fetch,
+            (KEY, barrier, computations, results),
+            PROCESSES
+        )
+        values = [results.get(timeout=30) for _ in processes]
+        self.join(processes)
+        self.assertEqual(values, ['value'] * PROCESSES)
+        self.assertEqual(computations.value, 1)
+
+    def test_expired_lock_taken_by_another_request_is_kept(self):
+        def compute():
+            # Блокировка истекла, и её взял другой запрос.
+            cache.set(f'{KEY}:lock', 'other')
+            return 'value'
+
+        self.assertEqual(single_flight(KEY, compute, 60), 'value')
+        self.assertEqual(cache.get(f'{KEY}:lock'), 'other')
+
+    def test_version_bump_is_seen_by_other_processes(self):
+        version = current_version()
+        self.join(self.run_processes(bump, (), 1))
+        self.assertEqual(current_version(), version + 1)
@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+
+from api.fast_serializers import (
+    recipe_values, serialize_recipes, serialize_subscriptions
+)
+from api.management.bench import make_request, populate
+from api.management.commands.bench_serializers import (
+    RECIPE_QUERIES, SUBSCRIPTION_QUERIES
+)
+from api.serializers import (
+    FieldSelection, RecipeGetSerializer, UserSubscribeSerializer
+)
+from jobs.queue import DEFAULT_QUEUE, claim, execute
+from recipes.models import Recipe
+
+User = get_user_model()
+
+RECIPES = 12
+
+
+class FastSerializersTests(TestCase):
+    # Эталон — сериализаторы DRF, которые читают теги, ингредиенты и
+    # автора из связей в базе, а не из документов и снимков быстрого
+    # пути.
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.authors = populate(RECIPES)
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def recipes(self):
+        return Recipe.objects.filter(author__in=self.authors).order_by(
+            'id'
+        ).prefetch_related('tags', 'ingredientrecipe_set__ingredient')
+
+    def assert_recipes_match(self, users):
+        recipes = self.recipes()
+        for user in users:
+            for query in RECIPE_QUERIES:
+                with self.subTest(user=user, query=query):
+                    request = make_request(user, query)
+                    selection = FieldSelection(
+                        request,
+                        RecipeGetSerializer.Meta.fields,
+                        RecipeGetSerializer.compact_fields
+                    )
+                    self.assertEqual(
+                        self.render(serialize_recipes(
+                            recipe_values(recipes), request, selection
+                        )),
+                        self.render(RecipeGetSerializer(
+                            recipes, many=True, context={'request': request}
+                        ).data)
+                    )
+
+    def test_recipes_match_serializer(self):
+        self.assert_recipes_match((self.user, AnonymousUser()))
+
+    def test_recipes_match_after_ingredient_change(self):
+        self.assert_recipes_match((self.user,))
+        ingredient = self.recipes()[0].ingredients.first()
+        ingredient.measurement_unit = 'кг'
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.save()
+        for job in claim('test', [DEFAULT_QUEUE], 100):
+            self.assertTrue(execute(job))
+        self.assert_recipes_match((self.user,))
+
+    def test_subscriptions_match_serializer(self):
+        authors = User.objects.filter(
+            id__in=[author.id for author in self.authors]
+        ).order_by('id')
+        for query in SUBSCRIPTION_QUERIES:
+            with self.subTest(query=query):
+                request = make_request(self.user, query)
+                selection = FieldSelection(
+                    request,
+                    UserSubscribeSerializer.Meta.fields,
+                    UserSubscribeSerializer.compact_fields
+                )
+                self.assertEqual(
+                    self.render(serialize_subscriptions(
+                        authors.values(
+                            'email', 'id', 'username', 'first_name',
+                            'last_name'
+                        ),
+                        request,
+                        selection
+                    )),
+                    self.render(UserSubscribeSerializer(
+                        authors, many=True, context={'request': request}
+                    ).data)
+                )
@@ -0,0 +1,70 @@
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.urls import path
+from rest_framework import serializers
+
+from api.nplusone import Detector, NPlusOneError, NPlusOneTestMixin
+from recipes.models import Tag
+
+THRESHOLD = 3
+
+
+def fetch_tags(count):
+    for tag_id in range(1, count + 1):
+        list(Tag.objects.filter(id=tag_id))
+
+
+def tags_view(request):
+    fetch_tags(int(request.GET['count']))
+    return HttpResponse()
+
+
+urlpatterns = [path('tags/', tags_view)]
+
+
+class TagNameSerializer(serializers.Serializer):
+    name = serializers.SerializerMethodField()
+
+    def get_name(self, tag_id):
+        return Tag.objects.filter(id=tag_id).values_list(
+            'name', flat=True
+        ).first()
+
+
+class DetectorTests(TestCase):
+
+    def test_threshold(self):
+        with Detector(THRESHOLD) as detector:
+            fetch_tags(THRESHOLD)
+        self.assertEqual(detector.problems, {})
+        with Detector(THRESHOLD) as detector:
+            fetch_tags(THRESHOLD + 1)
+        self.assertEqual(len(detector.problems), 1)
+        [key] = detector.problems
+        self.assertEqual(detector.counts[key], THRESHOLD + 1)
+        self.assertIn('test_nplusone.py', detector.report())
+
+    def test_raise(self):
+        with Detector(THRESHOLD, raise_on_detect=True):
+            fetch_tags(THRESHOLD)
+            with self.assertRaises(NPlusOneError):
+                fetch_tags(1)
+
+    def test_origin(self):
+        with Detector(THRESHOLD) as detector:
+            TagNameSerializer(range(THRESHOLD + 1), many=True).data
+        [problem] = detector.problems.values()
+        self.assertEqual(problem['origin'], 'TagNameSerializer.name')
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class NPlusOneTestMixinTests(NPlusOneTestMixin, TestCase):
+    nplusone_threshold = THRESHOLD
+
+    def test_request_within_threshold(self):
+        response = self.client.get('/tags/', {'count': THRESHOLD})
+        self.assertEqual(response.status_code, 200)
+
+    def test_request_over_threshold(self):
+        with self.assertRaises(NPlusOneError):
+            self.client.get('/tags/', {'count': THRESHOLD + 1})
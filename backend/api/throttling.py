@@ -0,0 +1,132 @@
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+SYNC_INTERVAL = 1.0
+MAX_BUCKETS = 10000
+CACHE_PREFIX = 'throttle'
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    if rate is None:
+        return None
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+class Bucket:
+    __slots__ = ('tokens', 'updated', 'synced', 'pending', 'seen')
+
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.updated = now
+        self.synced = None
+        self.pending = 0
+        self.seen = 0
+
+
+class TokenBucketThrottle(BaseThrottle):
+    # Корзины живут в памяти процесса, и проверка запроса не ходит в кэш.
+    # Раз в SYNC_INTERVAL корзина добавляет свой расход к общему счётчику
+    # в кэше и вычитает у себя то, что за это время израсходовали другие
+    # воркеры. Поэтому лимит может быть превышен не больше чем на расход
+    # остальных воркеров за один интервал. Кэш обязан быть общим для
+    # процессов (это проверяет api.checks), иначе у каждого воркера свой
+    # лимит.
+    buckets = OrderedDict()
+    lock = Lock()
+
+    def get_scope(self, view):
+        scopes = getattr(view, 'throttle_scopes', {})
+        return scopes.get(
+            getattr(view, 'action', None),
+            getattr(view, 'throttle_scope', None)
+        )
+
+    def get_key_and_rate(self, request, scope):
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        user = request.user
+        if user and user.is_authenticated:
+            return f'{scope}:user:{user.pk}', parse_rate(rates.get(scope))
+        anon_scope = f'{scope}_anon'
+        return (
+            f'{scope}:anon:{self.get_ident(request)}',
+            parse_rate(rates.get(anon_scope, rates.get(scope)))
+        )
+
+    def get_bucket(self, key, capacity, now):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = Bucket(capacity, now)
+            if len(self.buckets) > MAX_BUCKETS:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(view)
+        if scope is None:
+            return True
+        key, rate = self.get_key_and_rate(request, scope)
+        if rate is None:
+            return True
+        capacity, period = rate
+        refill = capacity / period
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.get_bucket(key, capacity, now)
+            bucket.tokens = min(
+                capacity, bucket.tokens + (now - bucket.updated) * refill
+            )
+            bucket.updated = now
+            fresh = bucket.synced is None
+            if fresh or now - bucket.synced >= SYNC_INTERVAL:
+                delta, bucket.pending, bucket.synced = bucket.pending, 0, now
+            else:
+                delta = None
+        if delta is not None:
+            self.sync(key, bucket, delta, capacity, period, fresh)
+        with self.lock:
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                bucket.pending += 1
+                return True
+            self.retry_after = (1 - bucket.tokens) / refill
+        return False
+
+    def sync(self, key, bucket, delta, capacity, period, fresh):
+        cache_key = f'{CACHE_PREFIX}:{key}'
+        total = None
+        if delta:
+            try:
+                total = cache.incr(cache_key, delta)
+            except ValueError:
+                if cache.add(cache_key, delta, period):
+                    total = delta
+                else:
+                    total = cache.incr(cache_key, delta)
+        if total is None:
+            total = cache.get(cache_key, 0)
+        with self.lock:
+            if fresh:
+                # Новая корзина: счётчик живёт не дольше периода, поэтому
+                # его значение — оценка того, что уже израсходовано.
+                spent = min(total, capacity)
+            elif total >= bucket.seen + delta:
+                spent = total - bucket.seen - delta
+            else:
+                # Счётчик истёк и начался заново.
+                spent = max(total - delta, 0)
+            bucket.tokens = max(bucket.tokens - spent, 0)
+            bucket.seen = total
+
+    def wait(self):
+        return getattr(self, 'retry_after', None)
@@ -1,4 +1,4 @@
-from django.urls import include, path
+from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
 from . import views
@@ -7,6 +7,21 @@ from api.views import CustomUserViewSet
 v1_router = DefaultRouter()
 
 v1_router.register('tags', views.TagViewSet)
+v1_router.register(
+    'recipes/shopping_cart',
+    views.ShoppingCartBatchViewSet,
+    basename='shopping_cart_batch'
+)
+v1_router.register(
+    'recipes/favorite',
+    views.FavoriteBatchViewSet,
+    basename='favorite_batch'
+)
+v1_router.register(
+    'users/subscribe',
+    views.SubscribeBatchViewSet,
+    basename='subscribe_batch'
+)
 v1_router.register(
     'recipes', views.RecipeViewSet, basename='recipes'
 )
@@ -26,9 +41,20 @@ v1_router.register(
     basename='subscribe'
 )
 v1_router.register('ingredients', views.IngredientViewSet)
+v1_router.register('changes', views.ChangeViewSet, basename='changes')
 v1_router.register('users', CustomUserViewSet)
 
 urlpatterns = [
     path('', include(v1_router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path(
+        'images/<str:variant>/<path:name>',
+        views.image_variant,
+        name='image_variant'
+    ),
+    re_path(
+        r'^ingredients/catalog/ingredients\.(?P<version>[0-9a-f]+)\.json$',
+        views.ingredient_catalog,
+        name='ingredient_catalog'
+    ),
 ]
@@ -1,35 +1,69 @@
+import hashlib
+from concurrent.futures import TimeoutError
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse, Http404, HttpResponse, StreamingHttpResponse
+)
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_safe
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
-from rest_framework import filters, status
+from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.viewsets import GenericViewSet, ModelViewSet
 
+from .images import VARIANT_SUFFIX, get_variant
+from .fast_serializers import (
+    SHORT_RECIPE_FIELDS,
+    USER_FIELDS,
+    image_url,
+    personalize,
+    recipe_values,
+    serialize_recipes,
+    shared_recipes,
+    serialize_subscriptions
+)
+from .caching import single_flight
+from .facets import cache_key, recipe_facets
 from .filters import RecipeFilter
 from .mixins import (
-    CreateDestroyRelationshipViewSet, ListRetrieveViewSet
+    BatchRelationshipViewSet,
+    CreateDestroyRelationshipViewSet,
+    ReferenceListRetrieveViewSet
 )
 from .permissions import IsAuthorOrReadOnly
 from .serializers import (
+    BatchSerializer,
+    ChangesQuerySerializer,
+    CookableQuerySerializer,
+    FieldSelection,
     IngredientSerializer,
-    FavoriteSerializer,
     RecipeAddSerializer,
     RecipeGetSerializer,
     RecipePostSerializer,
-    ShoppingCartSerializer,
-    SubscribeSerializer,
     TagSerializer,
     UserSubscribeSerializer
 )
 from .utils import DownloadShoppingCartMixin
+from recipes.catalog import artifact_path, manifest
+from recipes.changes import changes_since, current_token
+from recipes.documents import current_version
+from recipes.popularity import record
+from recipes.transfer import export_lines
 from recipes.models import (
+    Change,
     Ingredient,
     AddedToFavorite,
     Recipe,
     ShoppingСart,
+    SimilarRecipe,
     Subscribe,
     Tag
 )
@@ -57,20 +91,27 @@ class CustomUserViewSet(UserViewSet):
         sub_id = request.user.subscriptions.all().values_list(
             'subscribed', flat=True
         )
-        subscriptions = User.objects.filter(id__in=sub_id)
+        subscriptions = User.objects.filter(id__in=sub_id).values(
+            'email', 'id', 'username', 'first_name', 'last_name'
+        )
+        selection = FieldSelection(
+            request,
+            UserSubscribeSerializer.Meta.fields,
+            UserSubscribeSerializer.compact_fields
+        )
         page = self.paginate_queryset(subscriptions)
-        serializer = UserSubscribeSerializer(
-            instance=page, many=True, context={'request': request}
+        data = serialize_subscriptions(
+            subscriptions if page is None else page, request, selection
         )
         if page is not None:
-            return self.get_paginated_response(serializer.data)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+            return self.get_paginated_response(data)
+        return Response(data, status=status.HTTP_200_OK)
 
 
-class TagViewSet(ListRetrieveViewSet):
+class TagViewSet(ReferenceListRetrieveViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
-    pagination_class = None
+    reference = 'tags'
 
 
 class RecipeViewSet(ModelViewSet, DownloadShoppingCartMixin):
@@ -79,6 +120,86 @@ class RecipeViewSet(ModelViewSet, DownloadShoppingCartMixin):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     http_method_names = ['get', 'post', 'delete', 'patch']
+    throttle_scopes = {
+        'create': 'recipe_write',
+        'partial_update': 'recipe_write',
+        'destroy': 'recipe_write',
+        'cookable': 'search',
+        'facets': 'search',
+    }
+
+    def get_field_selection(self):
+        return FieldSelection(
+            self.request,
+            RecipeGetSerializer.Meta.fields,
+            RecipeGetSerializer.compact_fields
+        )
+
+    def get_cache_key(self, request):
+        # Общая для всех пользователей часть ответа кэшируется по полному
+        # адресу запроса; хост входит в ключ из-за абсолютных ссылок.
+        location = hashlib.md5(
+            f'{request.get_host()}{request.get_full_path()}'.encode()
+        ).hexdigest()
+        return f'recipes:{self.action}:{current_version()}:{location}'
+
+    def is_personal_query(self, request):
+        return request.user.is_authenticated and any(
+            request.query_params.get(name) for name in (
+                'is_favorited', 'is_in_shopping_cart'
+            )
+        )
+
+    def list(self, request, *args, **kwargs):
+        selection = self.get_field_selection()
+
+        def compute():
+            queryset = recipe_values(
+                self.filter_queryset(self.get_queryset())
+            )
+            page = self.paginate_queryset(queryset)
+            recipes = shared_recipes(
+                queryset if page is None else page, request, selection
+            )
+            if page is None:
+                return None, recipes
+            return self.get_paginated_response(None).data, recipes
+
+        if self.is_personal_query(request):
+            envelope, recipes = compute()
+        else:
+            envelope, recipes = single_flight(
+                self.get_cache_key(request), compute,
+                settings.RECIPE_CACHE_TTL
+            )
+        data = personalize(recipes, request, selection)
+        if envelope is None:
+            return Response(data)
+        envelope = envelope.copy()
+        envelope['results'] = data
+        return Response(envelope)
+
+    def retrieve(self, request, *args, **kwargs):
+        selection = self.get_field_selection()
+
+        def compute():
+            try:
+                return shared_recipes(
+                    recipe_values(
+                        self.get_queryset().filter(pk=kwargs['pk'])
+                    ),
+                    request,
+                    selection
+                )
+            except (TypeError, ValueError):
+                return []
+
+        recipes = single_flight(
+            self.get_cache_key(request), compute, settings.RECIPE_CACHE_TTL
+        )
+        if not recipes:
+            raise Http404
+        return Response(personalize(recipes, request, selection)[0])
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -86,16 +207,29 @@ class RecipeViewSet(ModelViewSet, DownloadShoppingCartMixin):
         elif self.request.method in ['POST', 'PATCH']:
             return RecipePostSerializer
 
+    def get_written_data(self, instance):
+        # Документ уже собран сериализатором при записи, так что ответ
+        # строится без запросов к базе.
+        return shared_recipes(
+            [{
+                'id': instance.id,
+                'author_id': instance.author_id,
+                'document__document': instance.document.document,
+            }],
+            self.request,
+            self.get_field_selection()
+        )
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         instance = serializer.save(author=request.user)
-        recipe = RecipeGetSerializer(
-            instance=instance, context={'request': request}
-        )
-        headers = self.get_success_headers(recipe.data)
+        # Новый рецепт ещё никто не добавил в избранное и список покупок,
+        # а на самого себя подписаться нельзя: флаги заведомо ложны.
+        data = self.get_written_data(instance)[0][2]
+        headers = self.get_success_headers(data)
         return Response(
-            recipe.data, status=status.HTTP_201_CREATED, headers=headers
+            data, status=status.HTTP_201_CREATED, headers=headers
         )
 
     def update(self, request, *args, **kwargs):
@@ -105,107 +239,278 @@ class RecipeViewSet(ModelViewSet, DownloadShoppingCartMixin):
             instance, data=request.data, partial=partial
         )
         serializer.is_valid(raise_exception=True)
-        rcp_instance = serializer.save()
-
-        if getattr(instance, '_prefetched_objects_cache', None):
-            instance._prefetched_objects_cache = {}
-        recipe = RecipeGetSerializer(
-            instance=rcp_instance, context={'request': request}
-        )
+        instance = serializer.save()
         return Response(
-            recipe.data, status=status.HTTP_200_OK
+            personalize(
+                self.get_written_data(instance),
+                request,
+                self.get_field_selection()
+            )[0],
+            status=status.HTTP_200_OK
         )
 
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(IsAdminUser,),
+    )
+    def export(self, request):
+        response = StreamingHttpResponse(
+            export_lines(), content_type='application/x-ndjson'
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.ndjson"'
+        )
+        return response
 
-class ShoppingCartViewSet(CreateDestroyRelationshipViewSet):
-    serializer_class = ShoppingCartSerializer
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise Http404
+        recipes = [
+            relation.similar for relation in SimilarRecipe.objects.filter(
+                recipe_id=pk
+            ).select_related('similar')
+        ]
+        if not recipes:
+            get_object_or_404(Recipe, id=pk)
+        serializer = RecipeAddSerializer(
+            recipes, many=True, context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
-    def get_object(self):
-        return get_object_or_404(
-            ShoppingСart,
-            user=self.request.user,
-            recipe=Recipe.objects.get(id=self.kwargs['recipe_pk'])
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        filterset = self.filterset_class(
+            request.query_params,
+            queryset=self.get_queryset(),
+            request=request
+        )
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        return Response(
+            single_flight(
+                cache_key(filterset),
+                lambda: recipe_facets(filterset),
+                settings.RECIPE_CACHE_TTL
+            )
         )
 
-    def create(
-        self, request, *args, **kwargs
-    ):
-        return super().create(
-            request,
-            field='recipe',
-            key='recipe_pk',
-            post_serializer=RecipeAddSerializer,
-            model=Recipe,
-            *args,
-            **kwargs)
+    @action(detail=False, methods=['get'])
+    def cookable(self, request):
+        from recipes.ingredient_index import ingredient_index
 
-    def delete(self, request, *args, **kwargs):
-        return super().delete(
-            request, model=Recipe, key='recipe_pk', *args, **kwargs
+        query = CookableQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        ranked = ingredient_index.search(
+            query.validated_data['ingredients'],
+            max_missing=query.validated_data.get('max_missing')
         )
+        page = self.paginate_queryset(ranked)
+        if page is not None:
+            ranked = page
+        selection = self.get_field_selection()
+        recipes = {
+            recipe['id']: recipe for recipe in serialize_recipes(
+                recipe_values(
+                    Recipe.objects.filter(
+                        id__in=[recipe_id for recipe_id, _, _ in ranked]
+                    )
+                ),
+                request,
+                selection
+            )
+        }
+        data = []
+        for recipe_id, matched, missing in ranked:
+            if recipe_id not in recipes:
+                continue
+            recipe = recipes[recipe_id]
+            recipe['matched_ingredients'] = matched
+            recipe['missing_ingredients'] = missing
+            data.append(recipe)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data, status=status.HTTP_200_OK)
 
 
-class FavoriteViewSet(CreateDestroyRelationshipViewSet):
-    serializer_class = FavoriteSerializer
+class RecipeScoreMixin:
+    def relation_changed(self, target_ids, added):
+        super().relation_changed(target_ids, added)
+        record(self.model, target_ids, added)
 
-    def get_object(self):
-        return get_object_or_404(
-            AddedToFavorite,
-            user=self.request.user,
-            recipe=Recipe.objects.get(id=self.kwargs['recipe_pk'])
-        )
 
-    def create(
-        self, request, *args, **kwargs
-    ):
-        return super().create(
-            request,
-            field='recipe',
-            key='recipe_pk',
-            post_serializer=RecipeAddSerializer,
-            model=Recipe,
-            *args,
-            **kwargs)
+class RecipeRelationshipViewSet(
+    RecipeScoreMixin, CreateDestroyRelationshipViewSet
+):
+    field = 'recipe'
+    target_fields = SHORT_RECIPE_FIELDS
+    lookup_url_kwarg = 'recipe_pk'
 
-    def delete(self, request, *args, **kwargs):
-        return super().delete(
-            request, model=Recipe, key='recipe_pk', *args, **kwargs
-        )
+    def to_representation(self, row):
+        row['image'] = image_url(row['image'], self.request)
+        return row
+
+
+class ShoppingCartViewSet(RecipeRelationshipViewSet):
+    model = ShoppingСart
+    change_kind = Change.SHOPPING_CART
+    exists_message = 'Рецепт уже в списке покупок'
+    absent_message = 'Рецепта нет в списке покупок'
+
+
+class FavoriteViewSet(RecipeRelationshipViewSet):
+    model = AddedToFavorite
+    change_kind = Change.FAVORITE
+    exists_message = 'Рецепт уже в избранном'
+    absent_message = 'Рецепта нет в избранном'
 
 
 class SubscribeViewSet(CreateDestroyRelationshipViewSet):
-    serializer_class = SubscribeSerializer
+    model = Subscribe
+    change_kind = Change.SUBSCRIPTION
+    field = 'subscribed'
+    target_fields = USER_FIELDS
+    lookup_url_kwarg = 'user_pk'
+    not_found_status = status.HTTP_404_NOT_FOUND
+    exists_message = 'Вы уже подписаны на этого пользователя'
+    absent_message = 'Вы не подписаны на этого пользователя'
 
-    def get_object(self):
-        return get_object_or_404(
-            Subscribe,
-            user=self.request.user,
-            subscribed=User.objects.get(id=self.kwargs['user_pk'])
-        )
+    def validate_target(self, target_id):
+        if target_id == self.request.user.id:
+            raise ValidationError(
+                {'errors': 'Нельзя подписаться на самого себя'}
+            )
 
-    def create(
-        self, request, *args, **kwargs
-    ):
-        get_object_or_404(User, id=self.kwargs['user_pk'])
-        return super().create(
-            request,
-            field='subscribed',
-            key='user_pk',
-            post_serializer=UserSubscribeSerializer,
-            model=User,
-            *args,
-            **kwargs
+    def to_representation(self, row):
+        selection = FieldSelection(
+            self.request,
+            UserSubscribeSerializer.Meta.fields,
+            UserSubscribeSerializer.compact_fields
         )
+        return serialize_subscriptions([row], self.request, selection)[0]
+
+
+class ShoppingCartBatchViewSet(RecipeScoreMixin, BatchRelationshipViewSet):
+    serializer_class = BatchSerializer
+    model = ShoppingСart
+    change_kind = Change.SHOPPING_CART
+    target_model = Recipe
+    field = 'recipe'
+
+
+class FavoriteBatchViewSet(RecipeScoreMixin, BatchRelationshipViewSet):
+    serializer_class = BatchSerializer
+    model = AddedToFavorite
+    change_kind = Change.FAVORITE
+    target_model = Recipe
+    field = 'recipe'
+
+
+class SubscribeBatchViewSet(BatchRelationshipViewSet):
+    serializer_class = BatchSerializer
+    model = Subscribe
+    change_kind = Change.SUBSCRIPTION
+    target_model = User
+    field = 'subscribed'
+
+    def get_forbidden_ids(self):
+        return {self.request.user.id}
 
-    def delete(self, request, *args, **kwargs):
-        return super().delete(
-            request, model=User, key='user_pk', *args, **kwargs
+
+class ChangeViewSet(GenericViewSet):
+    permission_classes = (IsAuthenticated,)
+
+    def list(self, request):
+        query = ChangesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        since = query.validated_data.get('since')
+        if since is None:
+            # Первая синхронизация: клиент загружает списки целиком и
+            # дальше запрашивает изменения начиная с этого токена.
+            return Response({'token': current_token(), 'changes': []})
+        changes, has_more = changes_since(
+            request.user.id, since, query.validated_data['limit']
         )
+        if not changes:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response({
+            'token': changes[-1][0],
+            'has_more': has_more,
+            'changes': [
+                {'kind': kind, 'action': action, 'id': object_id}
+                for _, kind, action, object_id in changes
+            ],
+        })
 
 
-class IngredientViewSet(ListRetrieveViewSet):
+class IngredientViewSet(ReferenceListRetrieveViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    pagination_class = None
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('name',)
+    reference = 'ingredients'
+    search_field = 'name'
+    throttle_scope = 'search'
+    throttle_scopes = {'catalog': None}
+
+    @action(detail=False, methods=['get'])
+    def catalog(self, request):
+        # Клиент держит весь справочник у себя и сверяет только версию;
+        # сам файл отдаёт nginx из MEDIA_ROOT.
+        current = manifest()
+        etag = f'"{current["version"]}"'
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response({
+                **current,
+                'url': request.build_absolute_uri(
+                    f'{settings.MEDIA_URL}{settings.INGREDIENT_CATALOG_DIR}/'
+                    f'ingredients.{current["version"]}.json'
+                ),
+            })
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
+@require_safe
+def image_variant(request, variant, name):
+    if (
+        variant not in settings.IMAGE_VARIANTS
+        or not name.endswith(VARIANT_SUFFIX)
+        or name.startswith(settings.IMAGE_CACHE_DIR + '/')
+    ):
+        raise Http404
+    try:
+        path = get_variant(name[:-len(VARIANT_SUFFIX)], variant)
+    except SuspiciousFileOperation:
+        raise Http404
+    except TimeoutError:
+        return HttpResponse(status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    if path is None:
+        raise Http404
+    response = FileResponse(open(path, 'rb'), content_type='image/webp')
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+@require_safe
+def ingredient_catalog(request, version):
+    etag = f'"{version}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        compressed = 'gzip' in request.headers.get('Accept-Encoding', '')
+        try:
+            file = open(artifact_path(version, compressed), 'rb')
+        except FileNotFoundError:
+            raise Http404
+        response = FileResponse(file, content_type='application/json')
+        if compressed:
+            response['Content-Encoding'] = 'gzip'
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
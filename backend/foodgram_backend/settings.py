@@ -30,18 +30,43 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'jobs.apps.JobsConfig',
 ]
 
+API_PREFIX = '/api/'
+
+# Слои из foodgram_backend.middleware пропускают запросы к API_PREFIX.
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'foodgram_backend.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'foodgram_backend.middleware.CsrfViewMiddleware',
+    'foodgram_backend.middleware.AuthenticationMiddleware',
+    'foodgram_backend.middleware.MessageMiddleware',
+    'foodgram_backend.middleware.XFrameOptionsMiddleware',
 ]
 
+# Поиск N+1 запросов для разработки: NPLUSONE=true DEBUG=true и прогон
+# postman-коллекции, найденное пишется в лог api.nplusone.
+NPLUSONE_ENABLED = os.getenv('NPLUSONE', 'false').lower() == 'true'
+NPLUSONE_THRESHOLD = int(os.getenv('NPLUSONE_THRESHOLD', 5))
+NPLUSONE_RAISE = os.getenv('NPLUSONE_RAISE', 'false').lower() == 'true'
+if NPLUSONE_ENABLED:
+    MIDDLEWARE.insert(0, 'api.nplusone.NPlusOneMiddleware')
+
+# Профилирование отдельных запросов по запросу сотрудника (?profile=1 или
+# заголовок X-Profile) и выборочно каждого N-го запроса к маршруту.
+# Профили складываются в PROFILING_DIR: *.folded для flamegraph.pl и
+# speedscope, *.json со сводкой и выделениями памяти.
+PROFILING_ENABLED = os.getenv('PROFILING', 'false').lower() == 'true'
+PROFILING_SAMPLE_EVERY = int(os.getenv('PROFILING_SAMPLE_EVERY', 0))
+PROFILING_INTERVAL = 0.001
+PROFILING_DIR = os.getenv('PROFILING_DIR', BASE_DIR / 'profiles')
+PROFILING_KEEP = 200
+PROFILING_TOP_ALLOCATIONS = 20
+if PROFILING_ENABLED:
+    MIDDLEWARE.append('api.profiling.ProfilingMiddleware')
+
 ROOT_URLCONF = 'foodgram_backend.urls'
 
 TEMPLATES = [
@@ -74,6 +99,16 @@ DATABASES = {
     }
 }
 
+# Кэш общий для всех процессов: на нём держатся блокировки пересчёта
+# ответов и счётчики ограничения частоты запросов. Кэш в памяти
+# процесса не подходит, это проверяет api.checks.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+    }
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -109,6 +144,59 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/var/www/foodgram/media/'
 
+IMAGE_CACHE_DIR = 'cache'
+IMAGE_VARIANTS = {
+    'card': 480,
+    'detail': 960,
+    'retina': 1920,
+}
+IMAGE_CACHE_MAX_BYTES = int(
+    os.getenv('IMAGE_CACHE_MAX_BYTES', 2 * 1024 * 1024 * 1024)
+)
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_RENDER_TIMEOUT = 30
+
+INGREDIENT_CATALOG_DIR = 'catalog'
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+# Воркер занимает задачу на JOB_LEASE секунд и продлевает аренду, пока
+# жив; задачи упавшего воркера возвращаются в очередь после её истечения.
+JOB_LEASE = 60
+JOB_RETENTION = 7 * 24 * 60 * 60
+JOB_SCHEDULE = {
+    'rebuild-similar-recipes': {
+        'task': 'recipes.tasks.rebuild_similar_recipes',
+        'interval': 24 * 60 * 60,
+    },
+    'decay-recipe-scores': {
+        'task': 'recipes.tasks.decay_recipe_scores',
+        'interval': 60 * 60,
+    },
+    'compact-changes': {
+        'task': 'recipes.tasks.compact_changes',
+        'interval': 60 * 60,
+    },
+    'compact-ingredient-index': {
+        'task': 'recipes.tasks.compact_ingredient_index',
+        'interval': 60 * 60,
+    },
+}
+
+CHANGES_SETTLE_SECONDS = 2
+CHANGES_PAGE_SIZE = 100
+CHANGES_MAX_PAGE_SIZE = 1000
+
+POPULARITY_FAVORITE_WEIGHT = 3
+POPULARITY_SHOPPING_CART_WEIGHT = 2
+POPULARITY_NEW_RECIPE_WEIGHT = 10
+POPULARITY_HALF_LIFE = 3 * 24 * 60 * 60
+
+RECIPE_CACHE_TTL = 30
+
+RELATIONSHIP_PARTITIONS = int(os.getenv('RELATIONSHIP_PARTITIONS', 16))
+
+STARTUP_BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', 1500))
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -121,6 +209,27 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderes.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'api.renderes.MessagePackRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'api.parsers.MessagePackParser',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.TokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'search': '20/s',
+        'search_anon': '5/s',
+        'recipe_write': '30/m',
+        'relationship_write': '10/s',
+    },
+    'NUM_PROXIES': 1,
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.PageLimitPagination',
     'PAGE_SIZE': 6,
 
@@ -0,0 +1,21 @@
+from django.contrib import admin
+
+from .models import Job, Schedule
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'task', 'queue', 'status', 'attempts', 'run_at', 'finished_at'
+    )
+    list_filter = ('status', 'queue', 'task')
+    readonly_fields = (
+        'created', 'started_at', 'locked_until', 'finished_at', 'worker'
+    )
+
+
+class ScheduleAdmin(admin.ModelAdmin):
+    list_display = ('name', 'next_run_at')
+
+
+admin.site.register(Job, JobAdmin)
+admin.site.register(Schedule, ScheduleAdmin)
@@ -0,0 +1,102 @@
+import logging
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connections
+
+from jobs.queue import queue_stats, sync_schedules
+from jobs.worker import STOP_SIGNALS, Heartbeat, Worker, run_worker
+
+logging.basicConfig(
+    format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+
+SUPERVISE_INTERVAL = 5
+STATS_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = "Runs background job workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=settings.JOB_WORKERS
+        )
+        parser.add_argument(
+            '--queues', default='default',
+            help="Comma separated queue names"
+        )
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Run every ready job in this process and exit"
+        )
+        parser.add_argument(
+            '--stats', action='store_true',
+            help="Print queue depth and exit"
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.print_stats()
+            return
+        worker_args = (
+            options['queues'].split(','),
+            options['batch_size'],
+            options['poll_interval']
+        )
+        sync_schedules()
+        if options['once']:
+            worker = Worker(*worker_args)
+            with Heartbeat(worker.name):
+                while worker.run_once():
+                    pass
+            return
+        self.supervise(options['processes'], worker_args)
+
+    def print_stats(self):
+        for queue, row in queue_stats().items():
+            self.stdout.write(
+                f"{queue}: ready={row['ready']} delayed={row['delayed']} "
+                f"running={row['running']} failed={row['failed']} "
+                f"lag={row['lag']:.1f}s"
+            )
+
+    def supervise(self, processes, worker_args):
+        # Сигналы остановки блокируются и принимаются через sigtimedwait:
+        # stop.set() из обработчика сигнала может зависнуть, если основной
+        # поток в этот момент сам ждёт на том же событии.
+        signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+        stop = multiprocessing.Event()
+        # Соединение родителя не должно достаться дочерним процессам.
+        connections.close_all()
+        workers = [None] * processes
+        logged_at = time.monotonic()
+        while True:
+            for index, process in enumerate(workers):
+                if process is not None and process.is_alive():
+                    continue
+                if process is not None:
+                    logging.warning(
+                        "Worker %s exited with %s, restarting",
+                        process.pid, process.exitcode
+                    )
+                process = multiprocessing.Process(
+                    target=run_worker, args=(stop, *worker_args)
+                )
+                process.start()
+                workers[index] = process
+            if signal.sigtimedwait(STOP_SIGNALS, SUPERVISE_INTERVAL):
+                break
+            if time.monotonic() - logged_at > STATS_INTERVAL:
+                logged_at = time.monotonic()
+                for queue, row in queue_stats().items():
+                    logging.info("Queue %s - %s", queue, row)
+                connections.close_all()
+        stop.set()
+        for process in workers:
+            process.join()
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:33
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def lease_running_jobs(apps, schema_editor):
+    # Задачам, начатым до появления аренды, остаётся прежний таймаут.
+    apps.get_model('jobs', 'Job').objects.filter(status='running').update(
+        locked_until=F('started_at') + timedelta(minutes=10)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Занята до'),
+        ),
+        migrations.RunPython(lease_running_jobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+TASK_NAME_LENGTH = 200
+QUEUE_NAME_LENGTH = 50
+
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    task = models.CharField('Задача', max_length=TASK_NAME_LENGTH)
+    queue = models.CharField(
+        'Очередь', max_length=QUEUE_NAME_LENGTH, default='default'
+    )
+    kwargs = models.JSONField('Аргументы', default=dict)
+    status = models.CharField(
+        'Статус', max_length=10, choices=STATUSES, default=QUEUED
+    )
+    attempts = models.PositiveIntegerField('Попытки', default=0)
+    max_attempts = models.PositiveIntegerField('Максимум попыток', default=5)
+    run_at = models.DateTimeField('Запустить после', default=timezone.now)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    started_at = models.DateTimeField('Начата', null=True, blank=True)
+    locked_until = models.DateTimeField(
+        'Занята до', null=True, blank=True
+    )
+    finished_at = models.DateTimeField('Завершена', null=True, blank=True)
+    worker = models.CharField('Воркер', max_length=100, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        ordering = ('-created',)
+        indexes = (
+            # Воркеры выбирают только готовые задачи, поэтому индекс
+            # частичный и не растёт вместе с историей выполненных.
+            models.Index(
+                fields=('queue', 'run_at'),
+                condition=Q(status='queued'),
+                name='job_ready_idx'
+            ),
+            models.Index(
+                fields=('status', 'finished_at'),
+                name='job_status_finished_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.task} #{self.id}'
+
+
+class Schedule(models.Model):
+    name = models.CharField(
+        'Название', max_length=TASK_NAME_LENGTH, unique=True
+    )
+    next_run_at = models.DateTimeField('Следующий запуск')
+
+    class Meta:
+        verbose_name = 'Расписание'
+        verbose_name_plural = 'Расписания'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,197 @@
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .models import Job, Schedule
+
+DEFAULT_QUEUE = 'default'
+DEFAULT_MAX_ATTEMPTS = 5
+BACKOFF_BASE = 10
+BACKOFF_MAX = 60 * 60
+
+logger = logging.getLogger(__name__)
+
+_tasks = {}
+
+
+def task(name=None, queue=DEFAULT_QUEUE, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    def decorator(func):
+        func.task_name = name or f'{func.__module__}.{func.__name__}'
+        func.queue = queue
+        func.max_attempts = max_attempts
+        func.delay = lambda **kwargs: enqueue(func, kwargs)
+        _tasks[func.task_name] = func
+        return func
+    return decorator
+
+
+def enqueue(func, kwargs=None, countdown=0):
+    # Задача пишется в ту же транзакцию, что и вызвавший её код:
+    # воркер увидит её только после коммита и не увидит после отката.
+    return Job.objects.create(
+        task=func.task_name,
+        queue=func.queue,
+        max_attempts=func.max_attempts,
+        kwargs=kwargs or {},
+        run_at=timezone.now() + timedelta(seconds=countdown)
+    )
+
+
+def enqueue_once(func, kwargs=None):
+    # Задача, найденная здесь, остаётся заблокированной до конца
+    # транзакции, и claim её пропускает: воркер выполнит её уже после
+    # коммита. Повторный вызов в той же транзакции находит свою же
+    # задачу, а чужую заблокированную не ждёт и ставит новую.
+    kwargs = kwargs or {}
+    with transaction.atomic(savepoint=False):
+        job = Job.objects.select_for_update(skip_locked=True).filter(
+            task=func.task_name,
+            queue=func.queue,
+            status=Job.QUEUED,
+            kwargs=kwargs
+        ).order_by().first()
+    return job or enqueue(func, kwargs)
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def lease_end(now):
+    return now + timedelta(seconds=settings.JOB_LEASE)
+
+
+def claim(worker, queues, limit):
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True).filter(
+                status=Job.QUEUED, queue__in=queues, run_at__lte=now
+            ).order_by('run_at')[:limit]
+        )
+        Job.objects.filter(id__in=[job.id for job in jobs]).update(
+            status=Job.RUNNING,
+            started_at=now,
+            locked_until=lease_end(now),
+            worker=worker,
+            attempts=F('attempts') + 1
+        )
+    for job in jobs:
+        job.attempts += 1
+    return jobs
+
+
+def execute(job):
+    func = _tasks.get(job.task)
+    try:
+        if func is None:
+            raise LookupError(f'Unknown task {job.task}')
+        func(**job.kwargs)
+    except Exception:
+        logger.exception('Job %s failed', job)
+        fail(job, traceback.format_exc())
+        return False
+    Job.objects.filter(id=job.id).update(
+        status=Job.DONE, finished_at=timezone.now(), last_error=''
+    )
+    return True
+
+
+def fail(job, error):
+    now = timezone.now()
+    if job.attempts >= job.max_attempts:
+        Job.objects.filter(id=job.id).update(
+            status=Job.FAILED, finished_at=now, last_error=error
+        )
+        return
+    Job.objects.filter(id=job.id).update(
+        status=Job.QUEUED,
+        run_at=now + timedelta(seconds=backoff(job.attempts)),
+        last_error=error
+    )
+
+
+def extend_leases(worker):
+    return Job.objects.filter(status=Job.RUNNING, worker=worker).update(
+        locked_until=lease_end(timezone.now())
+    )
+
+
+def requeue_stale():
+    # Задачи упавшего воркера остаются в статусе running, но аренду
+    # больше никто не продлевает; после её истечения их забирает кто-то
+    # другой, поэтому задачи должны быть идемпотентны. Долгая задача
+    # живого воркера сюда не попадает, сколько бы она ни шла.
+    stale = Job.objects.filter(
+        status=Job.RUNNING, locked_until__lt=timezone.now()
+    )
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED,
+        finished_at=timezone.now(),
+        last_error='Превышено время выполнения'
+    )
+    return failed + stale.update(status=Job.QUEUED)
+
+
+def prune():
+    return Job.objects.filter(
+        status=Job.DONE,
+        finished_at__lt=timezone.now() - timedelta(
+            seconds=settings.JOB_RETENTION
+        )
+    ).delete()[0]
+
+
+def sync_schedules():
+    Schedule.objects.bulk_create(
+        [
+            Schedule(name=name, next_run_at=timezone.now())
+            for name in settings.JOB_SCHEDULE
+        ],
+        ignore_conflicts=True
+    )
+
+
+def run_schedules():
+    now = timezone.now()
+    with transaction.atomic():
+        due = list(
+            Schedule.objects.select_for_update(skip_locked=True).filter(
+                name__in=list(settings.JOB_SCHEDULE), next_run_at__lte=now
+            )
+        )
+        for schedule in due:
+            entry = settings.JOB_SCHEDULE[schedule.name]
+            func = _tasks.get(entry['task'])
+            if func is None:
+                logger.error('Unknown scheduled task %s', entry['task'])
+            else:
+                enqueue(func, entry.get('kwargs'))
+            schedule.next_run_at = now + timedelta(seconds=entry['interval'])
+        Schedule.objects.bulk_update(due, ('next_run_at',))
+    return len(due)
+
+
+def queue_stats():
+    now = timezone.now()
+    ready = Q(status=Job.QUEUED, run_at__lte=now)
+    rows = Job.objects.exclude(status=Job.DONE).values('queue').annotate(
+        ready=Count('id', filter=ready),
+        delayed=Count('id', filter=Q(status=Job.QUEUED, run_at__gt=now)),
+        running=Count('id', filter=Q(status=Job.RUNNING)),
+        failed=Count('id', filter=Q(status=Job.FAILED)),
+        oldest=Min('run_at', filter=ready)
+    ).order_by('queue')
+    stats = {}
+    for row in rows:
+        oldest = row.pop('oldest')
+        row['lag'] = (now - oldest).total_seconds() if oldest else 0
+        stats[row.pop('queue')] = row
+    return stats
@@ -0,0 +1,93 @@
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection
+
+from .queue import (
+    claim, execute, extend_leases, prune, requeue_stale, run_schedules
+)
+
+MAINTENANCE_INTERVAL = 30
+HEARTBEATS_PER_LEASE = 3
+STOP_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+logger = logging.getLogger(__name__)
+
+
+class Heartbeat(threading.Thread):
+    # Продлевает аренду всех задач воркера, пока основной поток их
+    # выполняет. Если продление не удалось, следующая попытка будет
+    # раньше, чем аренда истечёт.
+
+    def __init__(self, worker):
+        super().__init__(daemon=True)
+        self.worker = worker
+        self._stopped = threading.Event()
+
+    def run(self):
+        interval = settings.JOB_LEASE / HEARTBEATS_PER_LEASE
+        try:
+            while not self._stopped.wait(interval):
+                try:
+                    extend_leases(self.worker)
+                except DatabaseError:
+                    logger.exception('Heartbeat of %s failed', self.worker)
+                    connection.close()
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self.join()
+
+
+class Worker:
+    def __init__(self, queues, batch_size, poll_interval):
+        self.queues = queues
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.maintained_at = 0
+
+    def maintain(self):
+        now = time.monotonic()
+        if now - self.maintained_at < MAINTENANCE_INTERVAL:
+            return
+        self.maintained_at = now
+        run_schedules()
+        requeue_stale()
+        prune()
+
+    def run_once(self):
+        close_old_connections()
+        self.maintain()
+        jobs = claim(self.name, self.queues, self.batch_size)
+        for job in jobs:
+            execute(job)
+        return len(jobs)
+
+    def run(self, stop):
+        logger.info('Worker %s started, queues: %s', self.name, self.queues)
+        with Heartbeat(self.name):
+            while not stop.is_set():
+                if not self.run_once():
+                    stop.wait(self.poll_interval)
+        logger.info('Worker %s stopped', self.name)
+
+
+def run_worker(stop, *args):
+    # Останавливает дочерний процесс только событие stop от родителя:
+    # Ctrl+C не должен прерывать задачу на середине.
+    for signum in STOP_SIGNALS:
+        signal.signal(signum, signal.SIG_IGN)
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+    Worker(*args).run(stop)
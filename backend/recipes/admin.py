@@ -1,6 +1,11 @@
+from functools import partial
+
 from django.contrib import admin
+from django.db.transaction import on_commit
 
+from .documents import rebuild
 from .models import Tag, Ingredient, Recipe, IngredientRecipe
+from .signals import ingredients_changed
 
 
 class IngredientRecipeInline(admin.TabularInline):
@@ -18,6 +23,18 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ('name', 'author__username', 'tags__name',)
     inlines = (IngredientRecipeInline,)
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        rebuild([form.instance.id])
+        if not change or any(
+            formset.has_changed() for formset in formsets
+        ):
+            on_commit(partial(
+                ingredients_changed.send,
+                sender=Recipe,
+                recipe_id=form.instance.id
+            ))
+
     def added_to_favorite(self, obj):
         return obj.favorite.all().count()
 
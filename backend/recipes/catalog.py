@@ -0,0 +1,92 @@
+import gzip
+import hashlib
+import os
+
+import orjson
+from django.conf import settings
+from django.utils._os import safe_join
+
+from jobs.queue import enqueue_once
+
+from .models import Ingredient
+from .tasks import build_ingredient_catalog
+
+MANIFEST = 'ingredients.json'
+KEEP_VERSIONS = 5
+FIELDS = ('id', 'name', 'measurement_unit')
+
+
+def catalog_dir():
+    return safe_join(settings.MEDIA_ROOT, settings.INGREDIENT_CATALOG_DIR)
+
+
+def artifact_path(version, compressed=False):
+    suffix = '.json.gz' if compressed else '.json'
+    return os.path.join(catalog_dir(), f'ingredients.{version}{suffix}')
+
+
+def _write(path, data):
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+def _prune(keep):
+    # Старые версии удаляются не сразу: клиент мог получить манифест
+    # перед пересборкой и ещё не успеть скачать файл.
+    directory = catalog_dir()
+    artifacts = sorted(
+        (
+            entry for entry in os.scandir(directory)
+            if entry.name.startswith('ingredients.')
+            and entry.name.endswith('.json')
+            and entry.name != MANIFEST
+        ),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True
+    )
+    for entry in artifacts[KEEP_VERSIONS:]:
+        version = entry.name.split('.')[1]
+        if version == keep:
+            continue
+        for path in (artifact_path(version), artifact_path(version, True)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def build():
+    # Файл называется по хэшу содержимого, поэтому его можно кэшировать
+    # навсегда; актуальную версию сообщает маленький манифест.
+    ingredients = list(Ingredient.objects.order_by('id').values(*FIELDS))
+    data = orjson.dumps(ingredients)
+    version = hashlib.sha256(data).hexdigest()[:16]
+    os.makedirs(catalog_dir(), exist_ok=True)
+    if not os.path.exists(artifact_path(version, compressed=True)):
+        _write(artifact_path(version), data)
+        _write(
+            artifact_path(version, compressed=True),
+            gzip.compress(data, compresslevel=9, mtime=0)
+        )
+    os.utime(artifact_path(version))
+    manifest = {'version': version, 'count': len(ingredients)}
+    _write(os.path.join(catalog_dir(), MANIFEST), orjson.dumps(manifest))
+    _prune(version)
+    return manifest
+
+
+def manifest():
+    try:
+        with open(os.path.join(catalog_dir(), MANIFEST), 'rb') as file:
+            return orjson.loads(file.read())
+    except FileNotFoundError:
+        return build()
+
+
+def schedule_build():
+    # Массовая загрузка сохраняет ингредиенты по одному, а пересобрать
+    # каталог достаточно один раз: все сохранения транзакции попадают
+    # в одну задачу, и собирает каталог воркер, а не запрос.
+    enqueue_once(build_ingredient_catalog)
@@ -0,0 +1,104 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Exists, Max, Min, OuterRef
+from django.utils import timezone
+
+from .models import AddedToFavorite, Change, ShoppingСart
+
+BATCH_SIZE = 10000
+
+
+def log(user_id, kind, action, object_ids):
+    Change.objects.bulk_create(
+        Change(user_id=user_id, kind=kind, action=action, object_id=id)
+        for id in object_ids
+    )
+
+
+def _holders(model, recipe_id):
+    return model.objects.filter(recipe_id=recipe_id).values_list(
+        'user_id', flat=True
+    )
+
+
+def log_recipe_update(recipe_id):
+    # Изменение рецепта получают только те, у кого он в избранном или в
+    # списке покупок: остальным клиентам синхронизировать нечего.
+    users = set(_holders(AddedToFavorite, recipe_id))
+    users.update(_holders(ShoppingСart, recipe_id))
+    Change.objects.bulk_create(
+        Change(
+            user_id=user_id,
+            kind=Change.RECIPE,
+            action=Change.UPDATE,
+            object_id=recipe_id
+        )
+        for user_id in users
+    )
+
+
+def log_recipe_delete(recipe_id):
+    Change.objects.bulk_create(
+        Change(
+            user_id=user_id, kind=kind, action=Change.REMOVE,
+            object_id=recipe_id
+        )
+        for model, kind in (
+            (AddedToFavorite, Change.FAVORITE),
+            (ShoppingСart, Change.SHOPPING_CART),
+        )
+        for user_id in _holders(model, recipe_id)
+    )
+
+
+def current_token():
+    return Change.objects.aggregate(token=Max('id'))['token'] or 0
+
+
+def changes_since(user_id, since, limit):
+    # Id выдаются до коммита, поэтому запись с меньшим id может стать
+    # видна позже записи с большим. Свежие записи не отдаются, пока не
+    # пройдёт CHANGES_SETTLE_SECONDS, и выдача обрывается на первой из
+    # них, чтобы токен не перескочил через ещё не видимые изменения.
+    horizon = timezone.now() - timedelta(
+        seconds=settings.CHANGES_SETTLE_SECONDS
+    )
+    rows = list(
+        Change.objects.filter(user_id=user_id, id__gt=since).order_by(
+            'id'
+        ).values_list('id', 'kind', 'action', 'object_id', 'created')[
+            :limit + 1
+        ]
+    )
+    settled = []
+    for row in rows:
+        if row[-1] >= horizon:
+            return settled, False
+        settled.append(row[:-1])
+    return settled[:limit], len(settled) > limit
+
+
+def compact():
+    # Для каждого объекта клиенту достаточно последнего изменения,
+    # поэтому более ранние записи удаляются. Токены при этом остаются
+    # действительными: после любого токена сохраняется последнее
+    # изменение каждого объекта.
+    bounds = Change.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return 0
+    deleted = 0
+    for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+        deleted += Change.objects.filter(
+            id__gte=start, id__lt=start + BATCH_SIZE
+        ).filter(
+            Exists(
+                Change.objects.filter(
+                    user_id=OuterRef('user_id'),
+                    kind=OuterRef('kind'),
+                    object_id=OuterRef('object_id'),
+                    id__gt=OuterRef('id')
+                )
+            )
+        ).delete()[0]
+    return deleted
@@ -0,0 +1,154 @@
+import itertools
+from collections import defaultdict
+
+from django.db.transaction import on_commit
+from django.utils import timezone
+
+from . import versions
+from .models import IngredientRecipe, Recipe, RecipeDocument
+
+BATCH_SIZE = 1000
+AUTHOR_FIELDS = ('email', 'id', 'username', 'first_name', 'last_name')
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit', 'amount')
+RECIPE_FIELDS = ('id', 'name', 'image', 'text', 'cooking_time')
+VERSION_NAME = 'documents'
+
+
+def current_version():
+    return versions.current(VERSION_NAME)
+
+
+def bump_version():
+    # Версия входит в ключи кэша ответов API, так что после коммита
+    # изменения старые ответы перестают читаться во всех процессах.
+    versions.bump(VERSION_NAME)
+
+
+def build(ids):
+    # Собирается по таблицам, а не по снимку справочников: документ
+    # перестраивается в той же транзакции, что и изменение тега.
+    tags = defaultdict(list)
+    for recipe_id, *tag in Recipe.tags.through.objects.filter(
+        recipe_id__in=ids
+    ).order_by('recipe_id', 'tag_id').values_list(
+        'recipe_id', 'tag_id', 'tag__name', 'tag__color', 'tag__slug'
+    ):
+        tags[recipe_id].append(tag)
+    ingredients = defaultdict(list)
+    for recipe_id, *ingredient in IngredientRecipe.objects.filter(
+        recipe_id__in=ids
+    ).order_by('recipe_id', 'ingredient_id').values_list(
+        'recipe_id',
+        'ingredient_id',
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'amount'
+    ):
+        ingredients[recipe_id].append(ingredient)
+    documents = {}
+    for row in Recipe.objects.filter(id__in=ids).order_by().values_list(
+        *RECIPE_FIELDS, *[f'author__{field}' for field in AUTHOR_FIELDS]
+    ):
+        document = dict(zip(RECIPE_FIELDS, row))
+        document['author'] = list(row[len(RECIPE_FIELDS):])
+        document['tags'] = tags.get(document['id'], [])
+        document['ingredients'] = ingredients.get(document['id'], [])
+        documents[document['id']] = document
+    return documents
+
+
+def compose(recipe, author, tags, ingredients):
+    # Тот же документ, что собирает build, но из данных, которые у
+    # вызывающего уже есть: теги и ингредиенты — строки в порядке
+    # TAG_FIELDS и INGREDIENT_FIELDS.
+    document = {field: getattr(recipe, field) for field in RECIPE_FIELDS}
+    document['image'] = recipe.image.name
+    document['author'] = [getattr(author, field) for field in AUTHOR_FIELDS]
+    document['tags'] = sorted(list(tag) for tag in tags)
+    document['ingredients'] = sorted(
+        list(ingredient) for ingredient in ingredients
+    )
+    return document
+
+
+def _store(documents):
+    RecipeDocument.objects.bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=('recipe',),
+        update_fields=('document', 'updated')
+    )
+
+
+def save(recipe, document):
+    recipe.document = RecipeDocument(
+        recipe=recipe, document=document, updated=timezone.now()
+    )
+    _store([recipe.document])
+    on_commit(bump_version)
+
+
+def _rebuild(ids):
+    documents = {}
+    ids = iter(ids)
+    while chunk := list(itertools.islice(ids, BATCH_SIZE)):
+        built = build(chunk)
+        now = timezone.now()
+        _store([
+            RecipeDocument(recipe_id=id, document=document, updated=now)
+            for id, document in built.items()
+        ])
+        documents.update(built)
+    return documents
+
+
+def rebuild(ids):
+    documents = _rebuild(ids)
+    on_commit(bump_version)
+    return documents
+
+
+def rebuild_recipes(queryset):
+    return rebuild(
+        queryset.order_by().values_list('id', flat=True).iterator(
+            chunk_size=BATCH_SIZE
+        )
+    )
+
+
+def load(ids):
+    documents = dict(
+        RecipeDocument.objects.filter(recipe_id__in=ids).values_list(
+            'recipe_id', 'document'
+        )
+    )
+    missing = [id for id in ids if id not in documents]
+    if missing:
+        # Документы существующих рецептов строит миграция 0014, сюда
+        # попадают только рецепты, созданные в обход API и сигналов.
+        # Документ собирается по текущим данным, поэтому закэшированные
+        # ответы остаются верными и версию поднимать не нужно.
+        documents.update(_rebuild(missing))
+    return documents
+
+
+def check(fix=False):
+    stale = []
+    missing = []
+    ids = Recipe.objects.order_by('id').values_list('id', flat=True)
+    ids = ids.iterator(chunk_size=BATCH_SIZE)
+    while chunk := list(itertools.islice(ids, BATCH_SIZE)):
+        stored = dict(
+            RecipeDocument.objects.filter(recipe_id__in=chunk).values_list(
+                'recipe_id', 'document'
+            )
+        )
+        for id, document in build(chunk).items():
+            if id not in stored:
+                missing.append(id)
+            elif stored[id] != document:
+                stale.append(id)
+    if fix:
+        rebuild(missing + stale)
+    return missing, stale
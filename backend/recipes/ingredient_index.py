@@ -0,0 +1,249 @@
+import itertools
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+from threading import Lock, Thread
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+POLL_INTERVAL = 1
+MAX_PENDING = 1000
+BATCH_SIZE = 10000
+LOG_RETENTION = 24 * 60 * 60
+
+logger = logging.getLogger(__name__)
+
+
+class IngredientIndex:
+    # Постинг-листы ингредиент -> рецепты в формате CSR: для ингредиента
+    # ingredient_ids[i] номера строк рецептов лежат в
+    # rows[indptr[i]:indptr[i + 1]]. Изменения этого процесса сразу
+    # попадают в pending, изменения других процессов — не позже чем
+    # через POLL_INTERVAL: процесс дочитывает журнал IngredientIndexChange
+    # и перечитывает ингредиенты только изменённых рецептов. Когда pending
+    # разрастается, новый снимок строится в фоновом потоке, а запросы до
+    # подмены работают со старым.
+
+    def __init__(self):
+        self._lock = Lock()
+        self._snapshot = None
+        self._pending = {}
+        self._position = 0
+        self._polled_at = 0
+        self._rebuilding = False
+
+    def _load(self):
+        from .models import IngredientRecipe
+
+        rows = IngredientRecipe.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ).order_by()
+        pairs = np.fromiter(
+            itertools.chain.from_iterable(
+                rows.iterator(chunk_size=BATCH_SIZE)
+            ),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        recipe_ids, recipe_rows = np.unique(pairs[:, 0], return_inverse=True)
+        order = np.argsort(pairs[:, 1], kind='stable')
+        ingredient_ids, counts = np.unique(
+            pairs[order, 1], return_counts=True
+        )
+        indptr = np.zeros(len(ingredient_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return {
+            'recipe_ids': recipe_ids,
+            'sizes': np.bincount(
+                recipe_rows, minlength=len(recipe_ids)
+            ).astype(np.int32),
+            'removed': np.zeros(len(recipe_ids), dtype=bool),
+            'ingredient_ids': ingredient_ids,
+            'indptr': indptr,
+            'rows': recipe_rows[order].astype(np.int32),
+        }
+
+    def _horizon(self):
+        # Id журнала выдаются до коммита, и запись с меньшим id может
+        # стать видна позже. Позиция сдвигается только за записи старше
+        # CHANGES_SETTLE_SECONDS, более свежие читаются повторно — их
+        # применение идемпотентно.
+        return timezone.now() - timedelta(
+            seconds=settings.CHANGES_SETTLE_SECONDS
+        )
+
+    def _build(self):
+        from .models import IngredientIndexChange
+
+        # Позиция берётся до чтения таблицы: всё, что изменится во время
+        # чтения, будет применено повторно из журнала.
+        position = IngredientIndexChange.objects.filter(
+            created__lt=self._horizon()
+        ).aggregate(position=Max('id'))['position'] or 0
+        return self._load(), position
+
+    def _rebuild(self):
+        try:
+            snapshot, position = self._build()
+        except Exception:
+            logger.exception('Ingredient index rebuild failed')
+            snapshot = None
+        finally:
+            connection.close()
+        with self._lock:
+            if snapshot is not None:
+                self._snapshot = snapshot
+                self._pending = {}
+                self._position = position
+                self._polled_at = 0
+            self._rebuilding = False
+
+    def _start_rebuild(self):
+        if not self._rebuilding:
+            self._rebuilding = True
+            Thread(target=self._rebuild, daemon=True).start()
+
+    def _apply(self, recipe_id, ingredients):
+        snapshot = self._snapshot
+        position = np.searchsorted(snapshot['recipe_ids'], recipe_id)
+        if (
+            position < len(snapshot['recipe_ids'])
+            and snapshot['recipe_ids'][position] == recipe_id
+        ):
+            snapshot['removed'][position] = True
+        if ingredients:
+            self._pending[recipe_id] = ingredients
+        else:
+            self._pending.pop(recipe_id, None)
+
+    def _poll(self):
+        from .models import IngredientIndexChange, IngredientRecipe
+
+        horizon = self._horizon()
+        recipe_ids = set()
+        settled = True
+        for id, recipe_id, created in IngredientIndexChange.objects.filter(
+            id__gt=self._position
+        ).order_by('id').values_list('id', 'recipe_id', 'created'):
+            if recipe_id is None:
+                return True
+            recipe_ids.add(recipe_id)
+            settled = settled and created < horizon
+            if settled:
+                self._position = id
+        if not recipe_ids:
+            return False
+        ingredients = defaultdict(set)
+        for recipe_id, ingredient_id in IngredientRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            ingredients[recipe_id].add(ingredient_id)
+        for recipe_id in recipe_ids:
+            self._apply(recipe_id, frozenset(ingredients[recipe_id]))
+        return len(self._pending) > MAX_PENDING
+
+    def get_snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._snapshot is None:
+                self._snapshot, self._position = self._build()
+                self._pending = {}
+                self._polled_at = now
+            elif now - self._polled_at > POLL_INTERVAL:
+                # За LOG_RETENTION журнал мог очиститься, и дочитать его
+                # уже нельзя.
+                stale = now - self._polled_at > LOG_RETENTION
+                self._polled_at = now
+                if self._poll() or stale:
+                    self._start_rebuild()
+            return self._snapshot, dict(self._pending)
+
+    def update_recipe(self, recipe_id, ingredient_ids=None):
+        from .models import IngredientIndexChange, IngredientRecipe
+
+        if ingredient_ids is None:
+            ingredient_ids = IngredientRecipe.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('ingredient_id', flat=True)
+        ingredients = frozenset(ingredient_ids)
+        IngredientIndexChange.objects.create(recipe_id=recipe_id)
+        with self._lock:
+            if self._snapshot is not None:
+                self._apply(recipe_id, ingredients)
+
+    def remove_recipe(self, recipe_id):
+        from .models import IngredientIndexChange
+
+        IngredientIndexChange.objects.create(recipe_id=recipe_id)
+        with self._lock:
+            if self._snapshot is not None:
+                self._apply(recipe_id, frozenset())
+
+    def invalidate(self):
+        from .models import IngredientIndexChange
+
+        IngredientIndexChange.objects.create(recipe_id=None)
+        with self._lock:
+            if self._snapshot is not None:
+                self._start_rebuild()
+
+    def search(self, ingredient_ids, max_missing=None):
+        snapshot, pending = self.get_snapshot()
+        requested = set(ingredient_ids)
+        positions = np.searchsorted(
+            snapshot['ingredient_ids'],
+            np.intersect1d(
+                np.fromiter(requested, dtype=np.int64),
+                snapshot['ingredient_ids']
+            )
+        )
+        indptr, rows = snapshot['indptr'], snapshot['rows']
+        covered = np.bincount(
+            np.concatenate(
+                [rows[indptr[p]:indptr[p + 1]] for p in positions]
+                or [rows[:0]]
+            ),
+            minlength=len(snapshot['recipe_ids'])
+        )
+        covered[snapshot['removed']] = 0
+        candidates = np.flatnonzero(covered)
+        recipe_ids = snapshot['recipe_ids'][candidates]
+        covered = covered[candidates]
+        missing = snapshot['sizes'][candidates] - covered
+        extra = [
+            (recipe_id, len(ingredients & requested),
+             len(ingredients - requested))
+            for recipe_id, ingredients in pending.items()
+            if ingredients & requested
+        ]
+        if extra:
+            extra = np.array(extra, dtype=np.int64)
+            recipe_ids = np.concatenate([recipe_ids, extra[:, 0]])
+            covered = np.concatenate([covered, extra[:, 1]])
+            missing = np.concatenate([missing, extra[:, 2]])
+        if max_missing is not None:
+            keep = missing <= max_missing
+            recipe_ids, covered, missing = (
+                recipe_ids[keep], covered[keep], missing[keep]
+            )
+        order = np.lexsort((-recipe_ids, missing, -covered))
+        return list(zip(
+            recipe_ids[order].tolist(),
+            covered[order].tolist(),
+            missing[order].tolist()
+        ))
+
+
+def compact():
+    from .models import IngredientIndexChange
+
+    IngredientIndexChange.objects.filter(
+        created__lt=timezone.now() - timedelta(seconds=LOG_RETENTION)
+    ).delete()
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,169 @@
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+
+from recipes.partitioning import convert
+
+logging.basicConfig(
+    format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+
+PLAIN = 'bench_relationship_plain'
+PARTITIONED = 'bench_relationship_hash'
+RECIPE_STEP = 104729
+RECIPES = 1000000
+
+QUERIES = {
+    'flags': (
+        'SELECT recipe_id FROM {table} '
+        'WHERE user_id = %s AND recipe_id = ANY(%s)'
+    ),
+    'list': 'SELECT recipe_id FROM {table} WHERE user_id = %s ORDER BY id',
+}
+
+
+def relations(plan):
+    if isinstance(plan, list):
+        for item in plan:
+            yield from relations(item)
+    elif isinstance(plan, dict):
+        if 'Relation Name' in plan:
+            yield plan['Relation Name']
+        for value in plan.values():
+            yield from relations(value)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares relationship queries on a plain table and on a table "
+        "hash-partitioned by user_id. Needs PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--per-user', type=int, default=20)
+        parser.add_argument(
+            '--partitions', type=int,
+            default=settings.RELATIONSHIP_PARTITIONS
+        )
+        parser.add_argument('--queries', type=int, default=2000)
+        parser.add_argument(
+            '--keep', action='store_true',
+            help="Keep the benchmark tables for manual inspection"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The benchmark needs PostgreSQL')
+        try:
+            self.create(options['users'], options['per_user'])
+            started = time.monotonic()
+            convert(connection, PARTITIONED, options['partitions'])
+            logging.info(
+                "Converted %s rows online in %.1fs",
+                options['users'] * options['per_user'],
+                time.monotonic() - started
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {PLAIN}')
+                cursor.execute(f'ANALYZE {PARTITIONED}')
+            self.report(options['users'], options['queries'])
+        finally:
+            if not options['keep']:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'DROP TABLE IF EXISTS {PLAIN}')
+                    cursor.execute(f'DROP TABLE IF EXISTS {PARTITIONED}')
+
+    def create(self, users, per_user):
+        with connection.cursor() as cursor:
+            for table in (PLAIN, PARTITIONED):
+                cursor.execute(f'DROP TABLE IF EXISTS {table}')
+                cursor.execute(
+                    f'CREATE TABLE {table} ('
+                    'id bigint GENERATED BY DEFAULT AS IDENTITY '
+                    f'CONSTRAINT {table}_pkey PRIMARY KEY, '
+                    'user_id integer NOT NULL, '
+                    'recipe_id integer NOT NULL, '
+                    f'CONSTRAINT {table}_uniq UNIQUE (user_id, recipe_id))'
+                )
+                cursor.execute(
+                    f'CREATE INDEX {table}_recipe ON {table} (recipe_id)'
+                )
+                logging.info("Filling %s", table)
+                cursor.execute(
+                    f'INSERT INTO {table} (user_id, recipe_id) '
+                    f'SELECT user_id, (user_id + step * {RECIPE_STEP}) '
+                    f'%% {RECIPES} '
+                    'FROM generate_series(1, %s) user_id, '
+                    'generate_series(1, %s) step',
+                    [users, per_user]
+                )
+
+    def measure(self, table, users, queries):
+        sample = random.Random(0)
+        timings = {}
+        with connection.cursor() as cursor:
+            for name, sql in QUERIES.items():
+                sql = sql.format(table=table)
+                started = time.perf_counter()
+                for _ in range(queries):
+                    user_id = sample.randint(1, users)
+                    params = [user_id]
+                    if name == 'flags':
+                        params.append([
+                            sample.randrange(RECIPES) for _ in range(20)
+                        ])
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                timings[name] = time.perf_counter() - started
+            started = time.perf_counter()
+            # Рецепты за пределами загруженных, чтобы не менять данные.
+            for _ in range(queries):
+                params = [
+                    sample.randint(1, users),
+                    RECIPES + sample.randrange(RECIPES)
+                ]
+                cursor.execute(
+                    f'INSERT INTO {table} (user_id, recipe_id) '
+                    'VALUES (%s, %s) ON CONFLICT DO NOTHING',
+                    params
+                )
+                cursor.execute(
+                    f'DELETE FROM {table} '
+                    'WHERE user_id = %s AND recipe_id = %s',
+                    params
+                )
+            timings['write'] = time.perf_counter() - started
+            # У обычной таблицы pg_partition_tree пуст, у секционированной
+            # сама родительская таблица весит ноль.
+            cursor.execute(
+                'SELECT pg_total_relation_size(%s) '
+                '+ coalesce(sum(pg_total_relation_size(relid)), 0) '
+                'FROM pg_partition_tree(%s)',
+                [table, table]
+            )
+            size = cursor.fetchone()[0]
+            cursor.execute(
+                'EXPLAIN (FORMAT JSON) '
+                + QUERIES['flags'].format(table=table),
+                [1, [1, 2, 3]]
+            )
+            plan = cursor.fetchone()[0]
+        return timings, size, len(set(relations(plan)))
+
+    def report(self, users, queries):
+        for table in (PLAIN, PARTITIONED):
+            timings, size, scanned = self.measure(table, users, queries)
+            self.stdout.write(
+                f'{table:26} '
+                + '  '.join(
+                    f'{name} {elapsed / queries * 1e6:7.1f} us'
+                    for name, elapsed in timings.items()
+                )
+                + f'  {size / 2 ** 20:7.1f} MiB'
+                + f'  tables scanned per user query: {scanned}'
+            )
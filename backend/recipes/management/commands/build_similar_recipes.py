@@ -0,0 +1,35 @@
+import logging
+import time
+
+from django.core.management import BaseCommand
+
+from recipes.similarity import CHUNK_SIZE, TOP_K, rebuild_similar_recipes
+
+logging.basicConfig(
+    format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the precomputed top-k similar recipes table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=TOP_K)
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help="Number of processes, defaults to the number of CPUs"
+        )
+
+    def handle(self, *args, **options):
+        logging.info("Rebuilding - similar recipes")
+        started = time.monotonic()
+        created = rebuild_similar_recipes(
+            top_k=options['top_k'],
+            chunk_size=options['chunk_size'],
+            workers=options['workers']
+        )
+        logging.info(
+            "Successfully - stored %s neighbours in %.1fs",
+            created, time.monotonic() - started
+        )
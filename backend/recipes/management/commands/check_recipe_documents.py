@@ -0,0 +1,36 @@
+import logging
+
+from django.core.management import BaseCommand, CommandError
+
+from recipes.documents import check
+
+logging.basicConfig(
+    format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+
+
+class Command(BaseCommand):
+    help = "Compares stored recipe documents with the recipe tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help="Rebuild missing and stale documents"
+        )
+
+    def handle(self, *args, **options):
+        missing, stale = check(fix=options['fix'])
+        for label, ids in (('missing', missing), ('stale', stale)):
+            if ids:
+                logging.warning(
+                    "Documents %s for %s recipes: %s", label, len(ids),
+                    ', '.join(map(str, ids[:20]))
+                )
+        if options['fix']:
+            logging.info(
+                "Successfully - rebuilt %s documents", len(missing + stale)
+            )
+        elif missing or stale:
+            raise CommandError("Recipe documents are inconsistent")
+        else:
+            logging.info("Successfully - all recipe documents are up to date")
@@ -0,0 +1,36 @@
+import logging
+import sys
+
+from django.core.management import BaseCommand
+
+from recipes.transfer import BATCH_SIZE, export_lines
+
+logging.basicConfig(
+    format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+
+
+class Command(BaseCommand):
+    help = "Streams every recipe as NDJSON to a file or stdout"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output', nargs='?', default='-',
+            help="Output file, '-' for stdout"
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            self.export(sys.stdout.buffer, options['batch_size'])
+            return
+        with open(options['output'], 'wb') as output:
+            self.export(output, options['batch_size'])
+
+    def export(self, output, batch_size):
+        exported = 0
+        lines = export_lines(batch_size=batch_size)
+        for exported, line in enumerate(lines, 1):
+            output.write(line)
+        output.flush()
+        logging.info("Successfully - exported %s recipes", exported)
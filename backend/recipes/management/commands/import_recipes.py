@@ -0,0 +1,73 @@
+import logging
+import os
+import sys
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from recipes.ingredient_index import ingredient_index
+from recipes.models import ImportCheckpoint
+from recipes.search import search_index
+from recipes.tasks import rebuild_similar_recipes
+from recipes.transfer import BATCH_SIZE, RecipeImporter, TransferError
+
+logging.basicConfig(
+    format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads recipes from an NDJSON export, resuming from the last "
+        "committed chunk"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="Input file, '-' for stdin")
+        parser.add_argument(
+            '--checkpoint',
+            help="Checkpoint name, defaults to the input file name"
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help="Ignore the saved checkpoint and start from the first line"
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint'] or os.path.basename(
+            options['input']
+        )
+        if checkpoint == '-':
+            raise CommandError('Для stdin укажите --checkpoint')
+        if options['restart']:
+            ImportCheckpoint.objects.filter(name=checkpoint).delete()
+        importer = RecipeImporter(checkpoint, options['batch_size'])
+        started = time.monotonic()
+        imported = done = 0
+        source = (
+            sys.stdin.buffer if options['input'] == '-'
+            else open(options['input'], 'rb')
+        )
+        try:
+            for imported, done in importer.run(source):
+                logging.info(
+                    "Imported - %s recipes, %s lines committed",
+                    imported, done
+                )
+        except TransferError as error:
+            raise CommandError(error)
+        finally:
+            source.close()
+            if imported:
+                # Воркеры API узнают об импорте из базы и перестроят свои
+                # копии индексов при следующей проверке.
+                search_index.invalidate()
+                ingredient_index.invalidate()
+        if imported:
+            rebuild_similar_recipes.delay()
+        logging.info(
+            "Successfully - imported %s recipes in %.1fs, "
+            "similar recipes rebuild queued",
+            imported, time.monotonic() - started
+        )
@@ -3,6 +3,8 @@ import logging
 from csv import DictReader
 
 from django.core.management import BaseCommand
+from django.db import transaction
+from recipes.catalog import build
 from recipes.models import Ingredient
 
 logging.basicConfig(
@@ -23,14 +25,18 @@ def main_fill():
         raise Exception(ALREDY_LOADED_ERROR_MESSAGE)
 
     logging.info("Loading - data a table - Ingredient")
-    for row in DictReader(
-        io.open("static/data/ingredients.csv", mode="r", encoding="utf-8")
-    ):
-        Ingredient.objects.get_or_create(
-            name=row["name"],
-            measurement_unit=row["measurement_unit"],
-        )
+    with transaction.atomic():
+        for row in DictReader(
+            io.open(
+                "static/data/ingredients.csv", mode="r", encoding="utf-8"
+            )
+        ):
+            Ingredient.objects.get_or_create(
+                name=row["name"],
+                measurement_unit=row["measurement_unit"],
+            )
     logging.info("Successfully - loading data table - Ingredient")
+    logging.info("Ingredient catalog version %s", build()["version"])
 
 
 class Command(BaseCommand):
@@ -0,0 +1,35 @@
+import logging
+import time
+
+from django.core.management import BaseCommand
+
+from recipes.popularity import decay, rebuild
+
+logging.basicConfig(
+    format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+
+
+class Command(BaseCommand):
+    help = "Applies the time decay to recipe popularity scores"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help="Recompute all scores from favorites and shopping carts"
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['rebuild']:
+            logging.info("Rebuilding - recipe popularity scores")
+            rebuild()
+            logging.info(
+                "Successfully - rebuilt in %.1fs", time.monotonic() - started
+            )
+            return
+        updated = decay()
+        logging.info(
+            "Successfully - decayed %s scores in %.1fs",
+            updated, time.monotonic() - started
+        )
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+ADD_SEARCH_VECTOR = """
+ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector
+GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian', coalesce(name, '')), 'A')
+    || setweight(to_tsvector('russian', coalesce(text, '')), 'B')
+) STORED;
+CREATE INDEX recipes_recipe_search_vector_gin
+ON recipes_recipe USING gin (search_vector);
+"""
+
+DROP_SEARCH_VECTOR = """
+DROP INDEX IF EXISTS recipes_recipe_search_vector_gin;
+ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector;
+"""
+
+
+def add_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(ADD_SEARCH_VECTOR)
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_VECTOR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_alter_ingredientrecipe_unique_together'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_vector, drop_search_vector),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:11
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Max
+
+RELATIONSHIPS = (
+    ('AddedToFavorite', ('user', 'recipe')),
+    ('ShoppingСart', ('user', 'recipe')),
+    ('Subscribe', ('user', 'subscribed')),
+)
+
+
+def remove_duplicates(apps, schema_editor):
+    for model_name, fields in RELATIONSHIPS:
+        model = apps.get_model('recipes', model_name)
+        duplicates = model.objects.values(*fields).annotate(
+            keep=Max('id'), total=Count('id')
+        ).filter(total__gt=1)
+        for duplicate in duplicates:
+            model.objects.filter(
+                **{field: duplicate[field] for field in fields}
+            ).exclude(id=duplicate['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0007_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='addedtofavorite',
+            unique_together={('user', 'recipe')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='shoppingсart',
+            unique_together={('user', 'recipe')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='subscribe',
+            unique_together={('user', 'subscribed')},
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_tag_ingredient_ordering'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True, verbose_name='Источник')),
+                ('lines', models.PositiveBigIntegerField(default=0, verbose_name='Загружено строк')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Отметка импорта',
+                'verbose_name_plural': 'Отметки импорта',
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:38
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+import recipes.models
+
+
+def fill_scores(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    now = timezone.now()
+    counts = [
+        (
+            weight,
+            dict(
+                apps.get_model('recipes', model).objects.values_list(
+                    'recipe_id'
+                ).annotate(Count('id')).order_by()
+            )
+        )
+        for model, weight in (
+            ('AddedToFavorite', settings.POPULARITY_FAVORITE_WEIGHT),
+            ('ShoppingСart', settings.POPULARITY_SHOPPING_CART_WEIGHT),
+        )
+    ]
+    recipes = []
+    for recipe in Recipe.objects.only('id', 'pub_date').iterator():
+        weight = settings.POPULARITY_NEW_RECIPE_WEIGHT + sum(
+            weight * model_counts.get(recipe.id, 0)
+            for weight, model_counts in counts
+        )
+        age = (now - recipe.pub_date).total_seconds()
+        recipe.score = weight * 0.5 ** (
+            max(age, 0) / settings.POPULARITY_HALF_LIFE
+        )
+        recipes.append(recipe)
+    Recipe.objects.bulk_update(recipes, ('score',), batch_size=5000)
+    apps.get_model('recipes', 'PopularityClock').objects.create(
+        id=1, decayed_at=now
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_referenceversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularityClock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('decayed_at', models.DateTimeField(verbose_name='Затухание применено')),
+            ],
+            options={
+                'verbose_name': 'Затухание популярности',
+                'verbose_name_plural': 'Затухание популярности',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='score',
+            field=models.FloatField(default=recipes.models.new_recipe_score, verbose_name='Популярность'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-score', '-pub_date'], name='recipe_score_idx'),
+        ),
+        migrations.RunPython(fill_scores, migrations.RunPython.noop),
+    ]
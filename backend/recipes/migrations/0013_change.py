@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0012_recipe_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('favorite', 'Избранное'), ('shopping_cart', 'Список покупок'), ('subscription', 'Подписка'), ('recipe', 'Рецепт')], max_length=16, verbose_name='Объект')),
+                ('action', models.CharField(choices=[('add', 'Добавление'), ('remove', 'Удаление'), ('update', 'Изменение')], max_length=8, verbose_name='Действие')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='Id объекта')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Изменение',
+                'verbose_name_plural': 'Изменения',
+                'indexes': [models.Index(fields=['user', 'id'], name='change_user_idx')],
+            },
+        ),
+    ]
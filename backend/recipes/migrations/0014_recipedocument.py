@@ -0,0 +1,76 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:43
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+AUTHOR_FIELDS = ('email', 'id', 'username', 'first_name', 'last_name')
+RECIPE_FIELDS = ('id', 'name', 'image', 'text', 'cooking_time')
+
+
+def build_documents(apps, schema_editor):
+    # Копия recipes.documents.build на исторических моделях: документы
+    # рецептов, созданных до этой миграции.
+    Recipe = apps.get_model('recipes', 'Recipe')
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    RecipeDocument = apps.get_model('recipes', 'RecipeDocument')
+    ids = list(Recipe.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(ids), BATCH_SIZE):
+        chunk = ids[start:start + BATCH_SIZE]
+        tags = defaultdict(list)
+        for recipe_id, *tag in Recipe.tags.through.objects.filter(
+            recipe_id__in=chunk
+        ).order_by('recipe_id', 'tag_id').values_list(
+            'recipe_id', 'tag_id', 'tag__name', 'tag__color', 'tag__slug'
+        ):
+            tags[recipe_id].append(tag)
+        ingredients = defaultdict(list)
+        for recipe_id, *ingredient in IngredientRecipe.objects.filter(
+            recipe_id__in=chunk
+        ).order_by('recipe_id', 'ingredient_id').values_list(
+            'recipe_id',
+            'ingredient_id',
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            'amount'
+        ):
+            ingredients[recipe_id].append(ingredient)
+        now = timezone.now()
+        documents = []
+        for row in Recipe.objects.filter(id__in=chunk).order_by().values_list(
+            *RECIPE_FIELDS, *[f'author__{field}' for field in AUTHOR_FIELDS]
+        ):
+            document = dict(zip(RECIPE_FIELDS, row))
+            document['author'] = list(row[len(RECIPE_FIELDS):])
+            document['tags'] = tags.get(document['id'], [])
+            document['ingredients'] = ingredients.get(document['id'], [])
+            documents.append(RecipeDocument(
+                recipe_id=document['id'], document=document, updated=now
+            ))
+        RecipeDocument.objects.bulk_create(documents)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_change'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='recipes.recipe')),
+                ('document', models.JSONField(verbose_name='Документ')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Документ рецепта',
+                'verbose_name_plural': 'Документы рецептов',
+            },
+        ),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+    ]
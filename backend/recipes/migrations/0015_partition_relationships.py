@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.db import migrations
+
+from recipes.partitioning import TABLES, convert
+
+
+def partition_tables(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        convert(connection, table, settings.RELATIONSHIP_PARTITIONS)
+
+
+def unpartition_tables(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        convert(connection, table, None)
+
+
+class Migration(migrations.Migration):
+    # Таблицы переносятся пачками в отдельных транзакциях.
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0014_recipedocument'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
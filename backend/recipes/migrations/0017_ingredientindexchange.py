@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientIndexChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Id рецепта')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+            ],
+            options={
+                'verbose_name': 'Изменение индекса ингредиентов',
+                'verbose_name_plural': 'Изменения индекса ингредиентов',
+            },
+        ),
+    ]
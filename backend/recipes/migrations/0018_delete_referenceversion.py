@@ -0,0 +1,16 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:09
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_ingredientindexchange'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='ReferenceVersion',
+        ),
+    ]
@@ -1,6 +1,7 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models, router
 
 FIELD_RESTRICTION = 200
 COLOR_FIELD_RESTRICTION = 7
@@ -8,6 +9,10 @@ COLOR_FIELD_RESTRICTION = 7
 User = get_user_model()
 
 
+def new_recipe_score():
+    return float(settings.POPULARITY_NEW_RECIPE_WEIGHT)
+
+
 class Tag(models.Model):
     name = models.CharField(
         'Название тега',
@@ -28,6 +33,7 @@ class Tag(models.Model):
     class Meta:
         verbose_name = 'Тег'
         verbose_name_plural = 'Теги'
+        ordering = ('id',)
 
     def __str__(self):
         return self.name
@@ -43,6 +49,7 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        ordering = ('id',)
 
     def __str__(self):
         return self.name
@@ -86,12 +93,19 @@ class Recipe(models.Model):
         related_name='shopping_cart',
         verbose_name='Список покупок'
     )
+    score = models.FloatField('Популярность', default=new_recipe_score)
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=('-score', '-pub_date'),
+                name='recipe_score_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -116,6 +130,69 @@ class IngredientRecipe(models.Model):
         unique_together = ('recipe', 'ingredient')
 
 
+class RelationshipQuerySet(models.QuerySet):
+    # Добавление и удаление связи — по одной инструкции, без
+    # предварительных SELECT: гонку двойного клика разрешает
+    # уникальное ограничение (user, target). В PostgreSQL таблицы связей
+    # секционированы по хэшу user_id (recipes.partitioning), поэтому
+    # частые запросы должны фильтровать по пользователю.
+
+    def _names(self, field, quote):
+        meta = self.model._meta
+        relation = meta.get_field(field)
+        target = relation.related_model._meta
+        return {
+            'table': quote(meta.db_table),
+            'pk': quote(meta.pk.column),
+            'user': quote(meta.get_field('user').column),
+            'field': quote(relation.column),
+            'target_table': quote(target.db_table),
+            'target_pk': quote(target.pk.column),
+        }
+
+    def _execute(self, sql, field, params):
+        connection = connections[router.db_for_write(self.model)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql.format(**self._names(field, connection.ops.quote_name)),
+                params
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def add(self, user, field, target_id):
+        return bool(self.add_many(user, field, [target_id]))
+
+    def remove(self, user, field, target_id):
+        return bool(self.remove_many(user, field, [target_id]))
+
+    def add_many(self, user, field, target_ids):
+        # Возвращает id только тех объектов, связь с которыми создала
+        # эта инструкция: существующие связи и несуществующие объекты
+        # пропускаются.
+        if not target_ids:
+            return set()
+        placeholders = ', '.join(['%s'] * len(target_ids))
+        return set(self._execute(
+            'INSERT INTO {table} ({user}, {field}) '
+            'SELECT %s, {target_pk} FROM {target_table} '
+            'WHERE {target_pk} IN (' + placeholders + ') '
+            'ON CONFLICT DO NOTHING RETURNING {field}',
+            field,
+            [user.id, *target_ids]
+        ))
+
+    def remove_many(self, user, field, target_ids):
+        if not target_ids:
+            return set()
+        placeholders = ', '.join(['%s'] * len(target_ids))
+        return set(self._execute(
+            'DELETE FROM {table} WHERE {user} = %s '
+            'AND {field} IN (' + placeholders + ') RETURNING {field}',
+            field,
+            [user.id, *target_ids]
+        ))
+
+
 class AddedToFavorite(models.Model):
     user = models.ForeignKey(
         User,
@@ -126,6 +203,11 @@ class AddedToFavorite(models.Model):
         on_delete=models.CASCADE,
     )
 
+    objects = RelationshipQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('user', 'recipe')
+
 
 class ShoppingСart(models.Model):
     user = models.ForeignKey(
@@ -137,6 +219,11 @@ class ShoppingСart(models.Model):
         on_delete=models.CASCADE,
     )
 
+    objects = RelationshipQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('user', 'recipe')
+
 
 class Subscribe(models.Model):
     user = models.ForeignKey(
@@ -149,3 +236,146 @@ class Subscribe(models.Model):
         on_delete=models.CASCADE,
         related_name='subscribers'
     )
+
+    objects = RelationshipQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('user', 'subscribed')
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('-score',)
+        unique_together = ('recipe', 'similar')
+        indexes = [
+            models.Index(
+                fields=('recipe', '-score'),
+                name='similar_recipe_score_idx'
+            ),
+        ]
+
+
+class ImportCheckpoint(models.Model):
+    name = models.CharField(
+        'Источник', max_length=FIELD_RESTRICTION, unique=True
+    )
+    lines = models.PositiveBigIntegerField('Загружено строк', default=0)
+    updated = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Отметка импорта'
+        verbose_name_plural = 'Отметки импорта'
+
+    def __str__(self):
+        return f'{self.name}: {self.lines}'
+
+
+class DataVersion(models.Model):
+    # Версии производных данных (документы рецептов, справочники,
+    # поисковый индекс). Хранятся в базе, чтобы изменение в любом
+    # процессе — воркере, задаче или команде — видели все остальные.
+    name = models.CharField('Название', max_length=64, primary_key=True)
+    version = models.PositiveBigIntegerField('Версия', default=0)
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
+
+
+class PopularityClock(models.Model):
+    # Единственная строка: момент последнего затухания оценок
+    # популярности, от него считается множитель следующего прохода.
+    decayed_at = models.DateTimeField('Затухание применено')
+
+    class Meta:
+        verbose_name = 'Затухание популярности'
+        verbose_name_plural = 'Затухание популярности'
+
+
+class Change(models.Model):
+    # Журнал изменений для синхронизации клиентов: id растёт монотонно
+    # и служит токеном синхронизации.
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    SUBSCRIPTION = 'subscription'
+    RECIPE = 'recipe'
+    KINDS = (
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Список покупок'),
+        (SUBSCRIPTION, 'Подписка'),
+        (RECIPE, 'Рецепт'),
+    )
+    ADD = 'add'
+    REMOVE = 'remove'
+    UPDATE = 'update'
+    ACTIONS = (
+        (ADD, 'Добавление'),
+        (REMOVE, 'Удаление'),
+        (UPDATE, 'Изменение'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    kind = models.CharField('Объект', max_length=16, choices=KINDS)
+    action = models.CharField('Действие', max_length=8, choices=ACTIONS)
+    object_id = models.PositiveBigIntegerField('Id объекта')
+    created = models.DateTimeField('Создано', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Изменения'
+        indexes = [
+            models.Index(fields=('user', 'id'), name='change_user_idx'),
+        ]
+
+
+class RecipeDocument(models.Model):
+    # Готовое, не зависящее от пользователя представление рецепта для
+    # чтения. Вложенные объекты хранятся массивами: jsonb не сохраняет
+    # порядок ключей, а ответ API должен его сохранять.
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='document'
+    )
+    document = models.JSONField('Документ')
+    updated = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Документ рецепта'
+        verbose_name_plural = 'Документы рецептов'
+
+
+class IngredientIndexChange(models.Model):
+    # Журнал изменений ингредиентов рецептов для индекса /cookable/:
+    # воркеры API дочитывают его и обновляют свои копии индекса только
+    # по изменённым рецептам. Пустой recipe — перестроить индекс целиком.
+    recipe_id = models.PositiveBigIntegerField(
+        'Id рецепта', null=True, blank=True
+    )
+    created = models.DateTimeField('Создано', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Изменение индекса ингредиентов'
+        verbose_name_plural = 'Изменения индекса ингредиентов'
@@ -0,0 +1,202 @@
+import logging
+
+from django.db import transaction
+
+PARTITION_KEY = 'user_id'
+BATCH_SIZE = 10000
+TABLES = (
+    'recipes_addedtofavorite',
+    'recipes_shoppingсart',
+    'recipes_subscribe',
+)
+
+logger = logging.getLogger(__name__)
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)",
+        [table]
+    )
+    return cursor.fetchone()[0]
+
+
+def _copy_structure(cursor, quote, table, target, partitions):
+    # Уникальные ограничения, внешние ключи и индексы переносятся под
+    # временными именами и получают исходные после удаления старой
+    # таблицы, чтобы миграции Django находили их по прежним именам.
+    cursor.execute(
+        'SELECT conname, contype, pg_get_constraintdef(oid) '
+        'FROM pg_constraint WHERE conrelid = to_regclass(%s) '
+        "AND contype IN ('p', 'u', 'f') ORDER BY conname",
+        [quote(table)]
+    )
+    renames = []
+    for number, (name, kind, definition) in enumerate(cursor.fetchall()):
+        if kind == 'p':
+            definition = (
+                f'PRIMARY KEY (id, {PARTITION_KEY})' if partitions
+                else 'PRIMARY KEY (id)'
+            )
+        temporary = f'{target}_c{number}'
+        cursor.execute(
+            f'ALTER TABLE {quote(target)} ADD CONSTRAINT {quote(temporary)} '
+            f'{definition}'
+        )
+        renames.append(('CONSTRAINT', temporary, name))
+    cursor.execute(
+        'SELECT index.relname, pg_get_indexdef(pg_index.indexrelid) '
+        'FROM pg_index '
+        'JOIN pg_class index ON index.oid = pg_index.indexrelid '
+        'WHERE pg_index.indrelid = to_regclass(%s) '
+        'AND NOT EXISTS (SELECT 1 FROM pg_constraint '
+        'WHERE conindid = pg_index.indexrelid) ORDER BY index.relname',
+        [quote(table)]
+    )
+    for number, (name, definition) in enumerate(cursor.fetchall()):
+        temporary = f'{target}_i{number}'
+        cursor.execute(
+            f'CREATE INDEX {quote(temporary)} ON {quote(target)} '
+            f'USING {definition.split(" USING ", 1)[1]}'
+        )
+        renames.append(('INDEX', temporary, name))
+    return renames
+
+
+def _drop_leftovers(cursor, quote, table, target):
+    # Остатки прерванного запуска: пока на живой таблице висит триггер,
+    # каждая запись дублируется в брошенную копию, а повторный запуск
+    # падает на CREATE. Секции и временные ограничения удаляются вместе
+    # с новой таблицей.
+    cursor.execute(
+        f'DROP TRIGGER IF EXISTS {quote(f"{target}_sync")} '
+        f'ON {quote(table)}'
+    )
+    cursor.execute(f'DROP FUNCTION IF EXISTS {quote(f"{target}_sync")}()')
+    cursor.execute(f'DROP TABLE IF EXISTS {quote(target)}')
+
+
+def _create_target(cursor, quote, table, target, partitions):
+    partition_by = (
+        f' PARTITION BY HASH ({PARTITION_KEY})' if partitions else ''
+    )
+    cursor.execute(
+        f'CREATE TABLE {quote(target)} (LIKE {quote(table)} '
+        'INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS)'
+        f'{partition_by}'
+    )
+    for remainder in range(partitions or 0):
+        cursor.execute(
+            f'CREATE TABLE {quote(f"{table}_p{remainder}")} '
+            f'PARTITION OF {quote(target)} '
+            f'FOR VALUES WITH (MODULUS {partitions}, '
+            f'REMAINDER {remainder})'
+        )
+    renames = _copy_structure(cursor, quote, table, target, partitions)
+    # Пока данные копируются пачками, триггер повторяет в новой таблице
+    # все изменения старой.
+    cursor.execute(
+        f'CREATE FUNCTION {quote(f"{target}_sync")}() RETURNS trigger '
+        'LANGUAGE plpgsql AS $$ BEGIN '
+        "IF TG_OP IN ('UPDATE', 'DELETE') THEN "
+        f'DELETE FROM {quote(target)} '
+        f'WHERE id = OLD.id AND {PARTITION_KEY} = OLD.{PARTITION_KEY}; '
+        'END IF; '
+        "IF TG_OP IN ('INSERT', 'UPDATE') THEN "
+        f'INSERT INTO {quote(target)} SELECT NEW.* '
+        'ON CONFLICT DO NOTHING; '
+        'END IF; '
+        'RETURN NULL; END $$'
+    )
+    cursor.execute(
+        f'CREATE TRIGGER {quote(f"{target}_sync")} '
+        f'AFTER INSERT OR UPDATE OR DELETE ON {quote(table)} '
+        f'FOR EACH ROW EXECUTE FUNCTION {quote(f"{target}_sync")}()'
+    )
+    return renames
+
+
+def _copy_rows(connection, quote, table, target, batch_size):
+    # FOR SHARE не даёт удалить строку между чтением и вставкой её
+    # копии: удаление дождётся коммита пачки, и триггер уберёт копию.
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT max(id) FROM {quote(table)}')
+        last_id = cursor.fetchone()[0] or 0
+    for start in range(0, last_id, batch_size):
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'WITH batch AS (SELECT * FROM {quote(table)} '
+                    'WHERE id > %s AND id <= %s FOR SHARE) '
+                    f'INSERT INTO {quote(target)} SELECT * FROM batch '
+                    'ON CONFLICT DO NOTHING',
+                    [start, start + batch_size]
+                )
+        logger.info(
+            '%s: copied %s of %s',
+            table, min(start + batch_size, last_id), last_id
+        )
+
+
+def _swap(cursor, quote, table, target, renames):
+    cursor.execute(f'LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE')
+    cursor.execute(
+        'SELECT pg_get_serial_sequence(%s, %s), '
+        'pg_get_serial_sequence(%s, %s)',
+        [quote(table), 'id', quote(target), 'id']
+    )
+    sequence, target_sequence = cursor.fetchone()
+    if target_sequence is None:
+        # Столбец id на serial: последовательность общая, её надо только
+        # передать новой таблице, иначе она удалится вместе со старой.
+        cursor.execute(
+            f'ALTER SEQUENCE {sequence} OWNED BY {quote(target)}.id'
+        )
+    else:
+        cursor.execute(
+            f'SELECT setval(%s, greatest(nextval(%s), '
+            f'(SELECT coalesce(max(id), 0) + 1 FROM {quote(table)})), '
+            'false)',
+            [target_sequence, sequence]
+        )
+    cursor.execute(f'DROP TABLE {quote(table)}')
+    cursor.execute(f'DROP FUNCTION {quote(f"{target}_sync")}()')
+    cursor.execute(f'ALTER TABLE {quote(target)} RENAME TO {quote(table)}')
+    for kind, temporary, name in renames:
+        if kind == 'CONSTRAINT':
+            cursor.execute(
+                f'ALTER TABLE {quote(table)} RENAME CONSTRAINT '
+                f'{quote(temporary)} TO {quote(name)}'
+            )
+        else:
+            cursor.execute(
+                f'ALTER INDEX {quote(temporary)} RENAME TO {quote(name)}'
+            )
+
+
+def convert(connection, table, partitions, batch_size=BATCH_SIZE):
+    # Перестраивает таблицу связей без долгой блокировки: новая таблица
+    # (секционированная по хэшу user_id или обычная при partitions=None)
+    # заполняется пачками, пока старая принимает запись, а короткая
+    # эксклюзивная блокировка нужна только для подмены.
+    quote = connection.ops.quote_name
+    target = f'{table}_new'
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            _drop_leftovers(cursor, quote, table, target)
+            if is_partitioned(cursor, quote(table)) == bool(partitions):
+                return
+            renames = _create_target(
+                cursor, quote, table, target, partitions
+            )
+    try:
+        _copy_rows(connection, quote, table, target, batch_size)
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                _swap(cursor, quote, table, target, renames)
+    except Exception:
+        logger.exception('%s: conversion failed, dropping the copy', table)
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                _drop_leftovers(cursor, quote, table, target)
+        raise
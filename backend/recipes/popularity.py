@@ -0,0 +1,124 @@
+import itertools
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, Min, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import (
+    AddedToFavorite, PopularityClock, Recipe, ShoppingСart
+)
+
+CLOCK_ID = 1
+MIN_SCORE = 1e-3
+BATCH_SIZE = 5000
+
+# Оценка — сумма весов событий (публикация, добавление в избранное и
+# в список покупок), каждый из которых затухает вдвое за
+# POPULARITY_HALF_LIFE. Новое событие прибавляет полный вес, а раз в час
+# все ненулевые оценки умножаются на накопившийся множитель затухания.
+
+
+def _weights():
+    return {
+        AddedToFavorite: settings.POPULARITY_FAVORITE_WEIGHT,
+        ShoppingСart: settings.POPULARITY_SHOPPING_CART_WEIGHT,
+    }
+
+
+def _chunks(iterator):
+    while chunk := list(itertools.islice(iterator, BATCH_SIZE)):
+        yield chunk
+
+
+def decay_factor(seconds):
+    return 0.5 ** (max(seconds, 0) / settings.POPULARITY_HALF_LIFE)
+
+
+def record(model, recipe_ids, added=True):
+    weight = _weights().get(model)
+    if not weight or not recipe_ids:
+        return
+    # Когда была добавлена удаляемая связь, неизвестно, поэтому
+    # вычитается полный вес; оценка не опускается ниже нуля.
+    Recipe.objects.filter(id__in=recipe_ids).update(
+        score=Greatest(
+            F('score') + (weight if added else -weight), Value(0.0)
+        )
+    )
+
+
+def initial_score(pub_date, now=None):
+    now = now or timezone.now()
+    return settings.POPULARITY_NEW_RECIPE_WEIGHT * decay_factor(
+        (now - pub_date).total_seconds()
+    )
+
+
+def decay(now=None):
+    now = now or timezone.now()
+    with transaction.atomic():
+        clock, created = PopularityClock.objects.select_for_update(
+        ).get_or_create(id=CLOCK_ID, defaults={'decayed_at': now})
+        if created:
+            return 0
+        factor = decay_factor((now - clock.decayed_at).total_seconds())
+        clock.decayed_at = now
+        clock.save(update_fields=('decayed_at',))
+    if factor >= 1:
+        return 0
+    # Проход идёт пачками по диапазонам id, каждая пачка в своей
+    # транзакции, чтобы не держать блокировки на всей таблице. Совсем
+    # малые оценки обнуляются и больше не попадают в проход.
+    bounds = Recipe.objects.filter(score__gt=0).aggregate(
+        low=Min('id'), high=Max('id')
+    )
+    if bounds['low'] is None:
+        return 0
+    updated = 0
+    for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+        updated += Recipe.objects.filter(
+            id__gte=start, id__lt=start + BATCH_SIZE, score__gt=0
+        ).update(
+            score=Case(
+                When(score__lt=MIN_SCORE / factor, then=Value(0.0)),
+                default=F('score') * factor
+            )
+        )
+    return updated
+
+
+def _counts(model, ids):
+    return dict(
+        model.objects.filter(recipe_id__in=ids).values_list(
+            'recipe_id'
+        ).annotate(Count('id')).order_by()
+    )
+
+
+def rebuild(now=None):
+    # Полный пересчёт по текущим связям. Время добавления связей не
+    # хранится, поэтому все события считаются совпавшими с публикацией.
+    now = now or timezone.now()
+    rows = Recipe.objects.order_by('id').values_list('id', 'pub_date')
+    for chunk in _chunks(rows.iterator(chunk_size=BATCH_SIZE)):
+        ids = [id for id, _ in chunk]
+        counts = {
+            model: (weight, _counts(model, ids))
+            for model, weight in _weights().items()
+        }
+        recipes = []
+        for id, pub_date in chunk:
+            weight = settings.POPULARITY_NEW_RECIPE_WEIGHT + sum(
+                weight * model_counts.get(id, 0)
+                for weight, model_counts in counts.values()
+            )
+            score = weight * decay_factor((now - pub_date).total_seconds())
+            recipes.append(
+                Recipe(id=id, score=score if score >= MIN_SCORE else 0.0)
+            )
+        Recipe.objects.bulk_update(recipes, ('score',))
+    PopularityClock.objects.update_or_create(
+        id=CLOCK_ID, defaults={'decayed_at': now}
+    )
@@ -0,0 +1,112 @@
+import time
+from threading import Lock
+
+from . import versions
+from .models import Ingredient, Tag
+
+CHECK_INTERVAL = 5
+VERSION_NAME = 'reference'
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit')
+
+
+class Snapshot:
+    # Неизменяемая копия таблицы: строки-кортежи в порядке id и индексы
+    # по id. Наружу отдаются новые словари, чтобы их можно было менять.
+
+    def __init__(self, fields, rows):
+        self.fields = fields
+        self.rows = tuple(rows)
+        self.ids = tuple(row[0] for row in self.rows)
+        self.by_id = {row[0]: row for row in self.rows}
+
+    def __contains__(self, id):
+        return id in self.by_id
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, id):
+        row = self.by_id.get(id)
+        if row is None:
+            return None
+        return dict(zip(self.fields, row))
+
+    def field(self, id, name):
+        return self.by_id[id][self.fields.index(name)]
+
+    def as_dicts(self, rows=None):
+        return [
+            dict(zip(self.fields, row))
+            for row in (self.rows if rows is None else rows)
+        ]
+
+    def search(self, field, terms):
+        position = self.fields.index(field)
+        terms = [term.casefold() for term in terms]
+        return [
+            row for row in self.rows
+            if all(term in row[position].casefold() for term in terms)
+        ]
+
+
+class ReferenceData:
+    # Теги и ингредиенты меняются редко, поэтому процесс держит их снимок
+    # в памяти. Версия в базе сверяется не чаще раза в CHECK_INTERVAL
+    # секунд; процесс, который сам изменил справочник, сбрасывает снимок
+    # сразу после коммита.
+
+    def __init__(self):
+        self._lock = Lock()
+        self._snapshots = None
+        self._version = None
+        self._checked_at = 0
+
+    def _load(self):
+        return {
+            'tags': Snapshot(
+                TAG_FIELDS,
+                Tag.objects.order_by('id').values_list(*TAG_FIELDS)
+            ),
+            'ingredients': Snapshot(
+                INGREDIENT_FIELDS,
+                Ingredient.objects.order_by('id').values_list(
+                    *INGREDIENT_FIELDS
+                )
+            ),
+        }
+
+    def _get(self):
+        now = time.monotonic()
+        snapshots = self._snapshots
+        if snapshots is not None and now - self._checked_at < CHECK_INTERVAL:
+            return snapshots
+        with self._lock:
+            version = current_version()
+            if self._snapshots is None or version != self._version:
+                self._snapshots = self._load()
+                self._version = version
+            self._checked_at = now
+            return self._snapshots
+
+    @property
+    def tags(self):
+        return self._get()['tags']
+
+    @property
+    def ingredients(self):
+        return self._get()['ingredients']
+
+    def invalidate(self):
+        self._snapshots = None
+
+
+reference_data = ReferenceData()
+
+
+def current_version():
+    return versions.current(VERSION_NAME)
+
+
+def bump_version():
+    versions.bump(VERSION_NAME)
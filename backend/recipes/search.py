@@ -0,0 +1,146 @@
+import re
+import time
+from collections import defaultdict
+from threading import Lock
+
+from django.db import connections
+from django.db.models import Case, FloatField, Value, When
+from django.db.models.expressions import RawSQL
+
+from . import versions
+
+VERSION_NAME = 'search_index'
+CHECK_INTERVAL = 5
+SEARCH_CONFIG = 'russian'
+SEARCH_VECTOR_COLUMN = 'search_vector'
+NAME_WEIGHT = 1.0
+TEXT_WEIGHT = 0.4
+MIN_STEM_LENGTH = 3
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+RUSSIAN_ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'иях', 'ях', 'ах', 'ией', 'ий', 'ый', 'ой',
+    'ей', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ого', 'его', 'ому', 'ему',
+    'ым', 'им', 'ом', 'ем', 'ую', 'юю', 'ою', 'ею', 'ов', 'ев', 'ия',
+    'ья', 'ье', 'ию', 'ью', 'а', 'я', 'о', 'е', 'ы', 'и',
+    'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+
+
+def stem(token):
+    token = token.lower().replace('ё', 'е')
+    for ending in RUSSIAN_ENDINGS:
+        if (
+            token.endswith(ending)
+            and len(token) - len(ending) >= MIN_STEM_LENGTH
+        ):
+            return token[:-len(ending)]
+    return token
+
+
+def tokenize(text):
+    return [stem(token) for token in TOKEN_RE.findall(text or '')]
+
+
+class RecipeSearchIndex:
+    # Индекс в памяти процесса; об изменениях в других процессах говорит
+    # версия в базе, её проверяют не чаще раза в CHECK_INTERVAL секунд.
+    def __init__(self):
+        self._lock = Lock()
+        self._postings = None
+        self._version = None
+        self._checked_at = 0
+
+    def invalidate(self):
+        versions.bump(VERSION_NAME)
+        self._postings = None
+
+    def _build(self, using):
+        from .models import Recipe
+
+        postings = defaultdict(lambda: defaultdict(float))
+        rows = Recipe.objects.using(using).values_list('id', 'name', 'text')
+        for recipe_id, name, text in rows.iterator():
+            for token in tokenize(name):
+                postings[token][recipe_id] += NAME_WEIGHT
+            for token in tokenize(text):
+                postings[token][recipe_id] += TEXT_WEIGHT
+        return {token: dict(ids) for token, ids in postings.items()}
+
+    def get_postings(self, using):
+        with self._lock:
+            now = time.monotonic()
+            if (
+                self._postings is not None
+                and now - self._checked_at > CHECK_INTERVAL
+            ):
+                self._checked_at = now
+                if versions.current(VERSION_NAME) != self._version:
+                    self._postings = None
+            if self._postings is None:
+                self._version = versions.current(VERSION_NAME)
+                self._postings = self._build(using)
+                self._checked_at = now
+            return self._postings
+
+    def search(self, query, using='default'):
+        tokens = set(tokenize(query))
+        if not tokens:
+            return {}
+        postings = self.get_postings(using)
+        matches = [postings.get(token, {}) for token in tokens]
+        matches.sort(key=len)
+        scores = dict(matches[0])
+        for posting in matches[1:]:
+            scores = {
+                recipe_id: score + posting[recipe_id]
+                for recipe_id, score in scores.items()
+                if recipe_id in posting
+            }
+        return scores
+
+
+search_index = RecipeSearchIndex()
+
+
+def _postgres_search(queryset, query):
+    from django.contrib.postgres.search import (
+        SearchQuery, SearchRank, SearchVectorField
+    )
+
+    vector = RawSQL(
+        f'"{queryset.model._meta.db_table}"."{SEARCH_VECTOR_COLUMN}"',
+        [],
+        output_field=SearchVectorField()
+    )
+    search_query = SearchQuery(
+        query, config=SEARCH_CONFIG, search_type='websearch'
+    )
+    return queryset.alias(search_vector=vector).filter(
+        search_vector=search_query
+    ).annotate(
+        search_rank=SearchRank(vector, search_query)
+    )
+
+
+def _fallback_search(queryset, query):
+    scores = search_index.search(query, using=queryset.db)
+    if not scores:
+        return queryset.none().annotate(search_rank=Value(0.0))
+    return queryset.filter(id__in=scores).annotate(
+        search_rank=Case(
+            *[When(id=pk, then=Value(score)) for pk, score in scores.items()],
+            output_field=FloatField()
+        )
+    )
+
+
+def search_recipes(queryset, query):
+    query = (query or '').strip()
+    if not query:
+        return queryset
+    if connections[queryset.db].vendor == 'postgresql':
+        queryset = _postgres_search(queryset, query)
+    else:
+        queryset = _fallback_search(queryset, query)
+    return queryset.order_by('-search_rank', '-pub_date')
@@ -0,0 +1,123 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.db.transaction import on_commit
+from django.dispatch import Signal, receiver
+
+from .catalog import schedule_build as schedule_catalog_build
+from .changes import log_recipe_delete, log_recipe_update
+from .documents import AUTHOR_FIELDS, bump_version as bump_documents_version
+from .models import Ingredient, Recipe, Tag
+from .reference import bump_version, reference_data
+from .search import search_index
+from .tasks import (
+    rebuild_documents, rebuild_related_documents, refresh_similar_recipes
+)
+
+User = get_user_model()
+
+# Отправляется после коммита, когда у рецепта изменился набор ингредиентов;
+# ingredient_ids передаёт новый набор, если он уже известен отправителю.
+ingredients_changed = Signal()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_search_index(using, **kwargs):
+    # PostgreSQL ищет по search_vector, индекс в памяти там не строится,
+    # и версию на каждую запись рецепта поднимать незачем.
+    if connections[using].vendor != 'postgresql':
+        on_commit(search_index.invalidate, using=using)
+
+
+@receiver(post_save, sender=Recipe)
+def log_recipe_change(instance, created, **kwargs):
+    if not created:
+        log_recipe_update(instance.id)
+
+
+@receiver(pre_delete, sender=Recipe)
+def log_recipe_removal(instance, **kwargs):
+    log_recipe_delete(instance.id)
+
+
+@receiver(post_delete, sender=Recipe)
+def expire_cached_documents(**kwargs):
+    on_commit(bump_documents_version)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_ingredient_index(instance, **kwargs):
+    from .ingredient_index import ingredient_index
+
+    on_commit(partial(ingredient_index.remove_recipe, instance.id))
+
+
+@receiver(ingredients_changed, sender=Recipe)
+def enqueue_similar_recipes(recipe_id, **kwargs):
+    refresh_similar_recipes.delay(recipe_id=recipe_id)
+
+
+@receiver(ingredients_changed, sender=Recipe)
+def refresh_ingredient_index(recipe_id, ingredient_ids=None, **kwargs):
+    from .ingredient_index import ingredient_index
+
+    ingredient_index.update_recipe(recipe_id, ingredient_ids)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def refresh_reference_data(**kwargs):
+    bump_version()
+    on_commit(reference_data.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def rebuild_ingredient_catalog(**kwargs):
+    schedule_catalog_build()
+
+
+@receiver(post_save, sender=Tag)
+def rebuild_tag_documents(instance, created, **kwargs):
+    if not created:
+        rebuild_related_documents.delay(field='tags', value=instance.id)
+
+
+@receiver(post_save, sender=Ingredient)
+def rebuild_ingredient_documents(instance, created, **kwargs):
+    if not created:
+        rebuild_related_documents.delay(
+            field='ingredients', value=instance.id
+        )
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def remember_document_recipes(sender, instance, **kwargs):
+    # После удаления связи уже не найти, поэтому рецепты запоминаются
+    # заранее и перестраиваются в post_delete.
+    lookup = 'tags' if sender is Tag else 'ingredients'
+    instance.document_recipe_ids = list(
+        Recipe.objects.filter(**{lookup: instance}).values_list(
+            'id', flat=True
+        )
+    )
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def rebuild_reference_documents(instance, **kwargs):
+    recipe_ids = getattr(instance, 'document_recipe_ids', [])
+    if recipe_ids:
+        rebuild_documents.delay(recipe_ids=recipe_ids)
+
+
+@receiver(post_save, sender=User)
+def rebuild_author_documents(instance, created, update_fields, **kwargs):
+    if created or (
+        update_fields is not None
+        and not set(update_fields) & set(AUTHOR_FIELDS)
+    ):
+        return
+    rebuild_related_documents.delay(field='author', value=instance.id)
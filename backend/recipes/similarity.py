@@ -0,0 +1,237 @@
+import itertools
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count
+from scipy import sparse
+
+from .models import IngredientRecipe, Recipe, SimilarRecipe
+
+TOP_K = 10
+CHUNK_SIZE = 256
+# Блок сходств chunk × n_recipes хранится плотным: так top-k ищется
+# одним argpartition. Ограничение держит блок в пределах 128 МБ.
+MAX_BLOCK_ELEMENTS = 32 * 1024 * 1024
+BATCH_SIZE = 5000
+MIN_SCORE = 1e-6
+# Ингредиенты, которые есть больше чем в половине рецептов (соль, вода),
+# почти не влияют на сходство, но делают произведение матриц плотным.
+# На маленьких базах отсекать их нельзя — частыми окажутся все.
+MAX_DOCUMENT_FREQUENCY = 0.5
+MIN_RECIPES_FOR_PRUNING = 1000
+
+_worker_matrix = None
+
+
+def load_pairs(queryset):
+    rows = queryset.values_list('recipe_id', 'ingredient_id').order_by()
+    pairs = np.fromiter(
+        itertools.chain.from_iterable(rows.iterator(chunk_size=BATCH_SIZE)),
+        dtype=np.int64
+    )
+    return pairs.reshape(-1, 2)
+
+
+def max_document_frequency(n_recipes):
+    if n_recipes < MIN_RECIPES_FOR_PRUNING:
+        return n_recipes
+    return MAX_DOCUMENT_FREQUENCY * n_recipes
+
+
+def inverse_document_frequency(document_frequency, n_recipes):
+    idf = np.log((1 + n_recipes) / (1 + document_frequency)) + 1
+    idf[document_frequency > max_document_frequency(n_recipes)] = 0
+    return idf.astype(np.float32)
+
+
+def tfidf_matrix(rows, cols, idf, shape):
+    matrix = sparse.csr_matrix(
+        (idf[cols], (rows, cols)), shape=shape, dtype=np.float32
+    )
+    matrix.eliminate_zeros()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms).dot(matrix).tocsr()
+
+
+def top_k_neighbours(chunk, matrix, offset, top_k):
+    scores = np.ascontiguousarray(matrix.dot(chunk.toarray().T).T)
+    rows = np.arange(scores.shape[0])
+    scores[rows, rows + offset] = 0
+    top_k = min(top_k, scores.shape[1] - 1)
+    if top_k < 1:
+        return rows[:0], rows[:0], scores[:0, 0]
+    cols = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    data = np.take_along_axis(scores, cols, axis=1)
+    rows = np.repeat(rows + offset, top_k)
+    cols, data = cols.ravel(), data.ravel()
+    keep = data > MIN_SCORE
+    return rows[keep], cols[keep], data[keep]
+
+
+def _init_worker(matrix):
+    global _worker_matrix
+    _worker_matrix = matrix
+
+
+def _worker_chunk(args):
+    start, chunk_size, top_k = args
+    return top_k_neighbours(
+        _worker_matrix[start:start + chunk_size], _worker_matrix, start, top_k
+    )
+
+
+def _iter_chunks(matrix, chunk_size, top_k, workers):
+    chunk_size = max(
+        1, min(chunk_size, MAX_BLOCK_ELEMENTS // max(matrix.shape[0], 1))
+    )
+    tasks = [
+        (start, chunk_size, top_k)
+        for start in range(0, matrix.shape[0], chunk_size)
+    ]
+    if workers <= 1:
+        _init_worker(matrix)
+        yield from map(_worker_chunk, tasks)
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(matrix,)
+    ) as executor:
+        yield from executor.map(_worker_chunk, tasks)
+
+
+def rebuild_similar_recipes(
+    top_k=TOP_K, chunk_size=CHUNK_SIZE, workers=None
+):
+    pairs = load_pairs(IngredientRecipe.objects.all())
+    recipe_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    ingredient_ids, cols = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = tfidf_matrix(
+        rows,
+        cols,
+        inverse_document_frequency(
+            np.bincount(cols, minlength=len(ingredient_ids)),
+            Recipe.objects.count()
+        ),
+        (len(recipe_ids), len(ingredient_ids))
+    )
+    del pairs, rows, cols
+    created = 0
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        for sources, targets, scores in _iter_chunks(
+            matrix, chunk_size, top_k, workers or os.cpu_count() or 1
+        ):
+            SimilarRecipe.objects.bulk_create(
+                [
+                    SimilarRecipe(
+                        recipe_id=recipe_id, similar_id=similar_id, score=score
+                    )
+                    for recipe_id, similar_id, score in zip(
+                        recipe_ids[sources].tolist(),
+                        recipe_ids[targets].tolist(),
+                        scores.tolist()
+                    )
+                ],
+                batch_size=BATCH_SIZE
+            )
+            created += len(sources)
+    return created
+
+
+def _document_frequency(ingredient_ids):
+    return dict(
+        IngredientRecipe.objects.filter(
+            ingredient_id__in=ingredient_ids
+        ).values_list('ingredient_id').annotate(Count('id')).order_by()
+    )
+
+
+def update_similar_recipes(recipe_id, top_k=TOP_K):
+    n_recipes = Recipe.objects.count()
+    own = _document_frequency(
+        IngredientRecipe.objects.filter(
+            recipe_id=recipe_id
+        ).values('ingredient_id')
+    )
+    informative = [
+        ingredient_id for ingredient_id, frequency in own.items()
+        if frequency <= max_document_frequency(n_recipes)
+    ]
+    pairs = load_pairs(
+        IngredientRecipe.objects.filter(
+            recipe_id__in=IngredientRecipe.objects.filter(
+                ingredient_id__in=informative
+            ).values('recipe_id')
+        )
+    )
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id=recipe_id).delete()
+        SimilarRecipe.objects.filter(similar_id=recipe_id).delete()
+        if not len(pairs):
+            return
+        recipe_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+        ingredient_ids, cols = np.unique(pairs[:, 1], return_inverse=True)
+        frequency = _document_frequency(ingredient_ids.tolist())
+        matrix = tfidf_matrix(
+            rows,
+            cols,
+            inverse_document_frequency(
+                np.array(
+                    [frequency[i] for i in ingredient_ids.tolist()],
+                    dtype=np.float64
+                ),
+                n_recipes
+            ),
+            (len(recipe_ids), len(ingredient_ids))
+        )
+        target = int(np.searchsorted(recipe_ids, recipe_id))
+        scores = matrix.dot(matrix[target].T).toarray().ravel()
+        scores[target] = 0
+        candidates = np.flatnonzero(scores > MIN_SCORE)
+        best = candidates[np.argsort(-scores[candidates])[:top_k]]
+        SimilarRecipe.objects.bulk_create([
+            SimilarRecipe(
+                recipe_id=recipe_id,
+                similar_id=similar_id,
+                score=score
+            )
+            for similar_id, score in zip(
+                recipe_ids[best].tolist(), scores[best].tolist()
+            )
+        ])
+        _offer_to_neighbours(
+            recipe_id,
+            dict(zip(
+                recipe_ids[candidates].tolist(),
+                scores[candidates].tolist()
+            )),
+            top_k
+        )
+
+
+def _offer_to_neighbours(recipe_id, scores, top_k):
+    # Остальные списки не пересчитываются целиком: рецепт только
+    # вытесняет из них самого слабого соседа. Полная пересборка —
+    # команда build_similar_recipes.
+    current = defaultdict(list)
+    for pk, owner_id, score in SimilarRecipe.objects.filter(
+        recipe_id__in=list(scores)
+    ).values_list('id', 'recipe_id', 'score').order_by('-score'):
+        current[owner_id].append((pk, score))
+    created, evicted = [], []
+    for owner_id, score in scores.items():
+        neighbours = current[owner_id]
+        if len(neighbours) >= top_k:
+            if score <= neighbours[top_k - 1][1]:
+                continue
+            evicted.extend(pk for pk, _ in neighbours[top_k - 1:])
+        created.append(
+            SimilarRecipe(
+                recipe_id=owner_id, similar_id=recipe_id, score=score
+            )
+        )
+    SimilarRecipe.objects.filter(id__in=evicted).delete()
+    SimilarRecipe.objects.bulk_create(created, batch_size=BATCH_SIZE)
@@ -0,0 +1,60 @@
+from jobs.queue import task
+
+
+@task()
+def refresh_similar_recipes(recipe_id):
+    from .similarity import update_similar_recipes
+
+    update_similar_recipes(recipe_id)
+
+
+@task()
+def rebuild_documents(recipe_ids):
+    from .documents import rebuild
+
+    rebuild(recipe_ids)
+
+
+@task()
+def rebuild_related_documents(field, value):
+    # Тег, ингредиент или автор могут встречаться в тысячах рецептов,
+    # поэтому их документы перестраиваются в фоне, а не в запросе.
+    from .documents import rebuild_recipes
+    from .models import Recipe
+
+    rebuild_recipes(Recipe.objects.filter(**{field: value}))
+
+
+@task()
+def build_ingredient_catalog():
+    from .catalog import build
+
+    build()
+
+
+@task(max_attempts=1)
+def rebuild_similar_recipes():
+    from .similarity import rebuild_similar_recipes
+
+    rebuild_similar_recipes(workers=1)
+
+
+@task(max_attempts=1)
+def compact_changes():
+    from .changes import compact
+
+    compact()
+
+
+@task(max_attempts=1)
+def compact_ingredient_index():
+    from .ingredient_index import compact
+
+    compact()
+
+
+@task(max_attempts=1)
+def decay_recipe_scores():
+    from .popularity import decay
+
+    decay()
@@ -0,0 +1,21 @@
+from django.db.models import F
+
+from .models import DataVersion
+
+
+def current(name):
+    return DataVersion.objects.filter(name=name).values_list(
+        'version', flat=True
+    ).first() or 0
+
+
+def bump(name):
+    versions = DataVersion.objects.filter(name=name)
+    if versions.update(version=F('version') + 1):
+        return
+    _, created = DataVersion.objects.get_or_create(
+        name=name, defaults={'version': 1}
+    )
+    if not created:
+        # Строку успел создать другой процесс.
+        versions.update(version=F('version') + 1)
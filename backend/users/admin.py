@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth import get_user_model
 
+from .tasks import delete_user
+
 User = get_user_model()
 
 
@@ -9,5 +11,16 @@ class CustomUserAdmin(UserAdmin):
     list_filter = ("email", "username")
     search_fields = ("email", "username")
 
+    def delete_model(self, request, obj):
+        # Пользователь сразу теряет доступ, а его рецепты и связи
+        # удаляются в фоне.
+        obj.is_active = False
+        obj.save(update_fields=('is_active',))
+        delete_user.delay(user_id=obj.id)
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            self.delete_model(request, user)
+
 
 admin.site.register(User, CustomUserAdmin)
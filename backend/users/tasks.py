@@ -0,0 +1,24 @@
+from jobs.queue import task
+
+BATCH_SIZE = 100
+
+
+@task()
+def delete_user(user_id):
+    # Рецепты удаляются пачками в отдельных транзакциях: у автора их
+    # могут быть тысячи, и одно каскадное удаление надолго держало бы
+    # блокировки. После сбоя повтор продолжает с оставшихся рецептов.
+    from django.db import transaction
+
+    from recipes.models import Recipe
+
+    from .models import User
+
+    recipes = Recipe.objects.filter(author_id=user_id)
+    while True:
+        with transaction.atomic():
+            ids = list(recipes.values_list('id', flat=True)[:BATCH_SIZE])
+            if not ids:
+                break
+            Recipe.objects.filter(id__in=ids).delete()
+    User.objects.filter(id=user_id).delete()